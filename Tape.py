@@ -3,6 +3,12 @@ from tkinter import filedialog, ttk
 from PIL import Image, ImageTk
 import os
 import random
+import dedup
+import profiling
+from batch import default_workers, list_images, run_batch
+# Sticker rendering lives in render.py
+from render import (add_sticker, add_sticker_stack, bucket_by_size, has_numpy, place_sticker, scale_sticker,
+                    stack_jobs, stack_pairs)
 
 def select_folder(type):
     folder_path = filedialog.askdirectory()
@@ -15,112 +21,151 @@ def select_folder(type):
         elif type == 'output':
             output_folder.set(folder_path)
 
-def preview_image():
-    if not wallpaper_folder.get() or not sticker_folder.get():
+PREVIEW_SIZE = (400, 400)
+
+# Decoded preview inputs, kept until the folder, sticker file or scale changes
+_preview = {"folder": None, "wallpaper": None, "sticker_key": None, "sticker": None,
+            "scaled_key": None, "scaled": None}
+_preview_job = None
+
+def schedule_preview(*args):
+    # Re-render shortly after the last change instead of polling
+    global _preview_job
+    if _preview_job is not None:
+        root.after_cancel(_preview_job)
+    _preview_job = root.after(50, preview_image)
+
+def load_preview_wallpaper(path):
+    with Image.open(path) as wallpaper:
+        # JPEG can decode straight to a fraction of its size
+        wallpaper.draft("RGB", (PREVIEW_SIZE[0] * 2, PREVIEW_SIZE[1] * 2))
+        wallpaper = wallpaper.convert("RGBA")
+    wallpaper.thumbnail(PREVIEW_SIZE)
+    return wallpaper
+
+def preview_image(new_wallpaper=False):
+    global _preview_job
+    _preview_job = None
+    folder = wallpaper_folder.get()
+    if not os.path.isdir(folder) or not sticker_folder.get() or not stickers_dropdown.get():
         return
 
-    sticker_path = os.path.join(sticker_folder.get(), stickers_dropdown.get())
-    wallpapers = [f for f in os.listdir(wallpaper_folder.get()) if f.lower().endswith(('.png', '.jpg', '.jpeg'))]
-    random_wallpaper = os.path.join(wallpaper_folder.get(), random.choice(wallpapers))
-
-    sticker = Image.open(sticker_path).convert("RGBA")
-    wallpaper = Image.open(random_wallpaper).convert("RGBA")
+    if new_wallpaper or _preview["folder"] != folder:
+        wallpapers = list_images(folder)
+        if not wallpapers:
+            return
+        _preview["wallpaper"] = load_preview_wallpaper(random.choice(wallpapers))
+        _preview["folder"] = folder
 
-    # Calculate sticker size relative to wallpaper dimensions
-    sticker_width = int(wallpaper.size[0] * sticker_scale.get())
-    sticker_height = int(sticker.size[1] * (sticker_width / sticker.size[0]))
-    sticker = sticker.resize((sticker_width, sticker_height), Image.LANCZOS)
-
-    # Create a new image with the same size as the wallpaper
-    combined = Image.new("RGBA", wallpaper.size)
-    combined.paste(wallpaper, (0, 0))
+    sticker_path = os.path.join(sticker_folder.get(), stickers_dropdown.get())
+    try:
+        sticker_key = (sticker_path, os.stat(sticker_path).st_mtime_ns)
+    except OSError:
+        return
+    if _preview["sticker_key"] != sticker_key:
+        _preview["sticker"] = Image.open(sticker_path).convert("RGBA")
+        _preview["sticker_key"] = sticker_key
 
-    # Position the sticker based on slider values
-    pos_x = int(x_pos_slider.get() * (wallpaper.size[0] - sticker.size[0]))
-    pos_y = int(y_pos_slider.get() * (wallpaper.size[1] - sticker.size[1]))
-    combined.paste(sticker, (pos_x, pos_y), sticker)
+    wallpaper = _preview["wallpaper"]
+    scaled_key = (sticker_key, wallpaper.size[0], sticker_scale.get())
+    if _preview["scaled_key"] != scaled_key:
+        _preview["scaled"] = scale_sticker(_preview["sticker"], wallpaper.size[0], sticker_scale.get())
+        _preview["scaled_key"] = scaled_key
 
-    combined.thumbnail((400, 400))  # Resize for preview
+    combined = place_sticker(wallpaper, _preview["scaled"], x_pos_slider.get(), y_pos_slider.get())
 
     combined_img = ImageTk.PhotoImage(combined)
     preview_label.config(image=combined_img)
     preview_label.image = combined_img
 
-    # Schedule the next update
-    root.after(100, preview_image)
-
-def process_images():
-    for filename in os.listdir(wallpaper_folder.get()):
-        if filename.lower().endswith((".png", ".jpg", ".jpeg")):
-            wallpaper_path = os.path.join(wallpaper_folder.get(), filename)
-            sticker_path = os.path.join(sticker_folder.get(), stickers_dropdown.get())
-
-            wallpaper = Image.open(wallpaper_path).convert("RGBA")
-            sticker = Image.open(sticker_path).convert("RGBA")
-
-            # Calculate sticker size relative to wallpaper dimensions
-            sticker_width = int(wallpaper.size[0] * sticker_scale.get())
-            sticker_height = int(sticker.size[1] * (sticker_width / sticker.size[0]))
-            sticker = sticker.resize((sticker_width, sticker_height), Image.LANCZOS)
-
-            # Create a new image with the same size as the wallpaper
-            combined = Image.new("RGBA", wallpaper.size)
-            combined.paste(wallpaper, (0, 0))
-
-            # Position the sticker based on slider values
-            pos_x = int(x_pos_slider.get() * (wallpaper.size[0] - sticker.size[0]))
-            pos_y = int(y_pos_slider.get() * (wallpaper.size[1] - sticker.size[1]))
-            combined.paste(sticker, (pos_x, pos_y), sticker)
-
-            # Convert to RGB if saving as JPEG
-            if filename.lower().endswith(".jpg") or filename.lower().endswith(".jpeg"):
-                combined = combined.convert("RGB")
-
-            combined.save(os.path.join(output_folder.get(), filename))
-
-root = tk.Tk()
-root.title("Wallpaper Sticker Overlay")
-
-sticker_folder = tk.StringVar()
-wallpaper_folder = tk.StringVar()
-output_folder = tk.StringVar()
-
-tk.Label(root, text="Sticker Folder:").pack()
-tk.Entry(root, textvariable=sticker_folder).pack()
-tk.Button(root, text="Select Sticker Folder", command=lambda: select_folder('sticker')).pack()
-
-tk.Label(root, text="Stickers:").pack()
-stickers_dropdown = ttk.Combobox(root)
-stickers_dropdown.pack()
-
-tk.Label(root, text="Wallpaper Folder:").pack()
-tk.Entry(root, textvariable=wallpaper_folder).pack()
-tk.Button(root, text="Select Wallpaper Folder", command=lambda: select_folder('wallpaper')).pack()
-
-tk.Label(root, text="Output Folder:").pack()
-tk.Entry(root, textvariable=output_folder).pack()
-tk.Button(root, text="Select Output Folder", command=lambda: select_folder('output')).pack()
-
-tk.Button(root, text="Preview", command=preview_image).pack(pady=10)
-
-preview_label = tk.Label(root)
-preview_label.pack()
-
-sticker_scale = tk.DoubleVar()
-sticker_scale.set(0.1)  # Default scale factor
-tk.Scale(root, from_=0.01, to=1, resolution=0.01, variable=sticker_scale, orient=tk.HORIZONTAL, label="Sticker Size (relative to wallpaper width)").pack()
-
-x_pos_slider = tk.DoubleVar()
-x_pos_slider.set(0.5)
-tk.Scale(root, from_=0, to=1, resolution=0.01, variable=x_pos_slider, orient=tk.HORIZONTAL, label="X Position").pack()
-
-y_pos_slider = tk.DoubleVar()
-y_pos_slider.set(0.5)
-tk.Scale(root, from_=0, to=1, resolution=0.01, variable=y_pos_slider, orient=tk.HORIZONTAL, label="Y Position").pack()
-
-tk.Button(root, text="Process", command=process_images).pack(pady=20)
-
-# Start the real-time preview update
-root.after(100, preview_image)
-
-root.mainloop()
+def process_images(workers=None, engine=None):
+    # engine "numpy" (the default when NumPy is installed) blends stacks of same-sized
+    # wallpapers in one array operation; "pillow" composites one wallpaper at a time
+    sticker_path = os.path.join(sticker_folder.get(), stickers_dropdown.get())
+    workers = workers or default_workers()
+    engine = engine or ("numpy" if has_numpy() else "pillow")
+    args = (sticker_path, sticker_scale.get(), x_pos_slider.get(), y_pos_slider.get())
+
+    # Byte-identical wallpapers are rendered once; the others get a link to that output
+    jobs, copies = dedup.plan([(wallpaper_path, os.path.join(output_folder.get(), os.path.basename(wallpaper_path)))
+                               for wallpaper_path in list_images(wallpaper_folder.get())])
+    outputs = dict(jobs)
+
+    # Same-sized wallpapers are sent to the workers together so each chunk reuses one resized sticker
+    jobs_by_size = {}
+    for size, wallpaper_paths in sorted(bucket_by_size(list(outputs)).items(), key=str):
+        jobs_by_size[size] = [(wallpaper_path, outputs[wallpaper_path]) for wallpaper_path in wallpaper_paths]
+
+    if engine == "numpy":
+        # Each stack reports its wallpapers one by one
+        stacks = stack_jobs(jobs_by_size)
+        results = run_batch(add_sticker_stack, [(stack[0][0], stack) for stack in stacks], args=args,
+                            workers=workers, group=stack_pairs)
+    else:
+        jobs = [job for size_jobs in jobs_by_size.values() for job in size_jobs]
+        chunk_size = max(1, min(16, len(jobs) // (workers * 4)))
+        results = run_batch(add_sticker, jobs, args=args, workers=workers, chunk_size=chunk_size)
+    rendered = {result.output_path for result in results if result.success}
+    for result in results:
+        if not result.success:
+            print(f"Failed to process {result.image_path}: {result.error}")
+    created = dedup.materialize(copies, rendered)
+    if created:
+        print(f"Processed {len(rendered) + len(created)} wallpapers" + dedup.describe(dedup.report(copies, created)))
+    if profiling.REPORT_PATH:
+        profiling.write_report(profiling.REPORT_PATH)
+
+if __name__ == "__main__":
+    root = tk.Tk()
+    root.title("Wallpaper Sticker Overlay")
+
+    sticker_folder = tk.StringVar()
+    wallpaper_folder = tk.StringVar()
+    output_folder = tk.StringVar()
+
+    tk.Label(root, text="Sticker Folder:").pack()
+    tk.Entry(root, textvariable=sticker_folder).pack()
+    tk.Button(root, text="Select Sticker Folder", command=lambda: select_folder('sticker')).pack()
+
+    tk.Label(root, text="Stickers:").pack()
+    stickers_dropdown = ttk.Combobox(root)
+    stickers_dropdown.pack()
+    stickers_dropdown.bind("<<ComboboxSelected>>", schedule_preview)
+
+    tk.Label(root, text="Wallpaper Folder:").pack()
+    tk.Entry(root, textvariable=wallpaper_folder).pack()
+    tk.Button(root, text="Select Wallpaper Folder", command=lambda: select_folder('wallpaper')).pack()
+
+    tk.Label(root, text="Output Folder:").pack()
+    tk.Entry(root, textvariable=output_folder).pack()
+    tk.Button(root, text="Select Output Folder", command=lambda: select_folder('output')).pack()
+
+    tk.Button(root, text="Preview", command=lambda: preview_image(new_wallpaper=True)).pack(pady=10)
+
+    preview_label = tk.Label(root)
+    preview_label.pack()
+
+    sticker_scale = tk.DoubleVar()
+    sticker_scale.set(0.1)  # Default scale factor
+    tk.Scale(root, from_=0.01, to=1, resolution=0.01, variable=sticker_scale, orient=tk.HORIZONTAL, label="Sticker Size (relative to wallpaper width)").pack()
+
+    x_pos_slider = tk.DoubleVar()
+    x_pos_slider.set(0.5)
+    tk.Scale(root, from_=0, to=1, resolution=0.01, variable=x_pos_slider, orient=tk.HORIZONTAL, label="X Position").pack()
+
+    y_pos_slider = tk.DoubleVar()
+    y_pos_slider.set(0.5)
+    tk.Scale(root, from_=0, to=1, resolution=0.01, variable=y_pos_slider, orient=tk.HORIZONTAL, label="Y Position").pack()
+
+    use_numpy = tk.BooleanVar(value=has_numpy())
+    tk.Checkbutton(root, text="Fast compositing (NumPy)", variable=use_numpy,
+                   state=tk.NORMAL if use_numpy.get() else tk.DISABLED).pack()
+
+    tk.Button(root, text="Process",
+              command=lambda: process_images(engine="numpy" if use_numpy.get() else "pillow")).pack(pady=20)
+
+    # Re-render the preview whenever an input changes
+    for variable in (sticker_folder, wallpaper_folder, sticker_scale, x_pos_slider, y_pos_slider):
+        variable.trace_add("write", schedule_preview)
+
+    root.mainloop()
@@ -1,160 +1,181 @@
 import tkinter as tk
 from tkinter import ttk, colorchooser, filedialog, messagebox
-from PIL import Image, ImageDraw, ImageFont, ImageTk
+from PIL import Image, ImageTk
 import os
+from functools import partial
+import threading
+import time
+import queue
+from collections import OrderedDict
 from datetime import datetime
 import calendar
-import matplotlib.font_manager as fm
-
-# Set Sunday as the first day of the week
-calendar.setfirstweekday(6)
-
-def get_available_fonts():
-    all_fonts = fm.findSystemFonts()
-    available_fonts = []
-    for font in all_fonts:
-        try:
-            ImageFont.truetype(font, 12)
-            font_name = fm.FontProperties(fname=font).get_name()
-            available_fonts.append(font_name)
-        except IOError:
-            continue
-    return sorted(set(available_fonts))
-
-def get_font(font_name, font_size, bold=False, italic=False):
-    try:
-        for font_path in fm.findSystemFonts():
-            try:
-                font_prop = fm.FontProperties(fname=font_path)
-                if (font_prop.get_name() == font_name and
-                        font_prop.get_weight() == ('bold' if bold else 'normal') and
-                        font_prop.get_style() == ('italic' if italic else 'normal')):
-                    return ImageFont.truetype(font_path, font_size)
-            except IOError:
-                continue
-        # If exact match not found, try to find any variant of the font
-        for font_path in fm.findSystemFonts():
+from batch import ENCODER_PRESETS, default_workers, list_images, output_path_for, run_batch, thread_safe_context
+import dedup
+import fontcatalog
+import profiling
+import settings
+from manifest import RenderManifest, params_hash
+from pipeline import run_pipeline
+# Rendering lives in render.py, which imports neither tkinter nor matplotlib
+from render import (add_calendar_months, build_font_index, clear_overlay_cache, draw_calendar, draw_calendar_strips,
+                    get_available_fonts, load_image_for_output, month_output_path, month_range, render_calendar,
+                    save_image)
+# Kept importable from here for existing scripts
+from render import add_calendar, get_font  # noqa: F401
+
+# Choices for the GUI; the first entry of each means "unchanged"
+OUTPUT_FORMATS = ["Same as input", "png", "jpg", "webp"]
+ENCODER_PRESET_NAMES = ["Pillow defaults", *ENCODER_PRESETS]
+
+# Largest size the preview is rendered at
+PREVIEW_SIZE = (600, 800)
+
+def load_preview_image(image_path, max_size=PREVIEW_SIZE):
+    # Decode at reduced scale and fit into max_size; returns the image and its scale
+    # relative to the full-resolution source
+    with Image.open(image_path) as img:
+        width, height = img.size
+        ratio = min(max_size[0] / width, max_size[1] / height)
+        new_size = (max(1, int(width * ratio)), max(1, int(height * ratio)))
+
+        # JPEG can decode straight to 1/2, 1/4 or 1/8 scale
+        img.draft("RGB", new_size)
+        # reduce() does not support every mode (e.g. palette, 1-bit and 16-bit images)
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA")
+        factor = min(img.width // new_size[0], img.height // new_size[1])
+        if factor > 1:
+            img = img.reduce(factor)
+        img = img.convert("RGBA")
+        if img.size != new_size:
+            img = img.resize(new_size, Image.Resampling.LANCZOS)
+        return img, ratio
+
+# Decoded preview images kept in memory, and how far ahead of the cursor to decode
+PREVIEW_CACHE_BYTES = 256 * 1024 * 1024
+PREFETCH_COUNT = 4
+
+class PreviewCache:
+    def __init__(self, max_size=PREVIEW_SIZE, max_bytes=PREVIEW_CACHE_BYTES):
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self._images = OrderedDict()  # path -> (signature, image, ratio)
+        self._bytes = 0
+        self._wanted = []
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def get(self, image_path):
+        signature = _file_signature(image_path)
+        with self._condition:
+            entry = self._images.get(image_path)
+            if entry is not None and entry[0] == signature:
+                self._images.move_to_end(image_path)
+                return entry[1], entry[2]
+
+        img, ratio = load_preview_image(image_path, self.max_size)
+        self._store(image_path, signature, img, ratio)
+        return img, ratio
+
+    def prefetch(self, image_paths):
+        # Replace the prefetch queue; the background thread decodes these in order
+        with self._condition:
+            self._wanted = [path for path in image_paths if path not in self._images]
+            self._condition.notify()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._prefetch_loop, daemon=True)
+            self._thread.start()
+
+    def clear(self):
+        with self._condition:
+            self._images.clear()
+            self._bytes = 0
+            self._wanted = []
+
+    def _store(self, image_path, signature, img, ratio):
+        image_bytes = img.width * img.height * 4
+        with self._condition:
+            previous = self._images.pop(image_path, None)
+            if previous is not None:
+                self._bytes -= previous[1].width * previous[1].height * 4
+            self._images[image_path] = (signature, img, ratio)
+            self._bytes += image_bytes
+            while self._bytes > self.max_bytes and len(self._images) > 1:
+                _, (_, evicted, _) = self._images.popitem(last=False)
+                self._bytes -= evicted.width * evicted.height * 4
+
+    def _prefetch_loop(self):
+        while True:
+            with self._condition:
+                while not self._wanted:
+                    self._condition.wait()
+                image_path = self._wanted.pop(0)
+                if image_path in self._images:
+                    continue
             try:
-                if fm.FontProperties(fname=font_path).get_name() == font_name:
-                    return ImageFont.truetype(font_path, font_size)
-            except IOError:
+                signature = _file_signature(image_path)
+                img, ratio = load_preview_image(image_path, self.max_size)
+            except Exception:
                 continue
-        return ImageFont.load_default()
-    except Exception:
-        return ImageFont.load_default()
-
-def add_calendar(image_path, output_path, font_name, font_color, box_color, weekday_color,
-                 holiday_color, day_name_color, transparency, curvature, table_size, x_offset, y_offset,
-                 selected_month, selected_year, bold=False, italic=False, hollow=False):
-    try:
-        with Image.open(image_path).convert("RGBA") as img:
-            overlay = Image.new('RGBA', img.size, (0, 0, 0, 0))
-            draw = ImageDraw.Draw(overlay)
-
-            img_width, img_height = img.size
-            base_size = min(img_width, img_height)
-            cell_width = int(base_size / 7 * table_size)
-            cell_height = int(base_size / 8 * table_size)
-            margin = int(0.02 * base_size * table_size)
-
-            font_size = int(base_size * table_size / 20)  # Adjust font size based on table size
-            regular_font = get_font(font_name, font_size, bold, italic)
-            day_name_font = get_font(font_name, int(font_size * 0.9), bold, italic)
-            month_font = get_font(font_name, int(font_size * 1.1), bold, italic)
-
-            cal = calendar.monthcalendar(selected_year, selected_month)
-            month_name = calendar.month_name[selected_month]
-
-            x_start = int(x_offset * (img_width - cell_width * 7))
-            y_start = int(y_offset * (img_height - (cell_height * (len(cal) + 1) + 2 * margin)))
-
-            title_text = f"{month_name} {selected_year}"
-            title_bbox = draw.textbbox((0, 0), title_text, font=month_font)
-            title_width = title_bbox[2] - title_bbox[0]
-            title_height = title_bbox[3] - title_bbox[1]
-            title_x = x_start + (cell_width * 7 - title_width) // 2
-            title_y = y_start + margin
-
-            # Draw background box
-            box_color_with_alpha = (*box_color[:3], int(255 * transparency))
-            calendar_width = cell_width * 7 + 2 * margin
-            calendar_height = cell_height * (len(cal) + 1) + 2 * margin + title_height
-            draw.rounded_rectangle(
-                [(x_start, y_start), (x_start + calendar_width, y_start + calendar_height)],
-                radius=int(curvature * base_size / 100), fill=box_color_with_alpha
-            )
-
-            # Draw month name
-            if hollow:
-                draw.text((title_x, title_y), title_text, font=month_font, stroke_width=2,
-                          stroke_fill=font_color, fill=None)
-            else:
-                draw.text((title_x, title_y), title_text, font=month_font, fill=font_color)
-
-            # Draw day names
-            days = ["SUN", "MON", "TUE", "WED", "THU", "FRI", "SAT"]
-            for i, day in enumerate(days):
-                x = x_start + i * cell_width + margin
-                y = y_start + title_height + 2 * margin
-                day_bbox = draw.textbbox((0, 0), day, font=day_name_font)
-                day_width = day_bbox[2] - day_bbox[0]
-                day_height = day_bbox[3] - day_bbox[1]
-                day_x = x + (cell_width - day_width) // 2
-                day_y = y + (cell_height - day_height) // 2
-                if hollow:
-                    draw.text((day_x, day_y), day, font=day_name_font, stroke_width=2,
-                              stroke_fill=day_name_color, fill=None)
-                else:
-                    draw.text((day_x, day_y), day, font=day_name_font, fill=day_name_color)
-
-            # Draw dates
-            for week_index, week in enumerate(cal):
-                for day_index, day in enumerate(week):
-                    if day != 0:
-                        x = x_start + day_index * cell_width + margin
-                        y = y_start + (week_index + 1) * cell_height + title_height + 2 * margin
-
-                        date_text = str(day)
-                        date_bbox = draw.textbbox((0, 0), date_text, font=regular_font)
-                        date_width = date_bbox[2] - date_bbox[0]
-                        date_height = date_bbox[3] - date_bbox[1]
-                        date_x = x + (cell_width - date_width) // 2
-                        date_y = y + (cell_height - date_height) // 2
-
-                        # Choose color based on whether it's a holiday (weekend)
-                        color = holiday_color if day_index in [5, 6] else weekday_color
-
-                        if hollow:
-                            draw.text((date_x, date_y), date_text, font=regular_font,
-                                      stroke_width=2, stroke_fill=color, fill=None)
-                        else:
-                            draw.text((date_x, date_y), date_text, font=regular_font, fill=color)
-
-            img = Image.alpha_composite(img, overlay)
-            if output_path.lower().endswith((".jpg", ".jpeg")):
-                img = img.convert("RGB")
-            img.save(output_path)
-            return True
-    except Exception as e:
-        print(f"Failed to process {image_path}: {e}")
-        return False
+            self._store(image_path, signature, img, ratio)
+
+def _file_signature(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+def render_preview(image_path, max_size=PREVIEW_SIZE, cache=None, **params):
+    # Render the calendar directly at preview size with the same proportional geometry
+    if cache is not None:
+        # draw_calendar works in place; keep the cached decode clean
+        img, ratio = cache.get(image_path)
+        img = img.copy()
+    else:
+        img, ratio = load_preview_image(image_path, max_size)
+    stroke_width = max(1, round(2 * ratio))
+    return draw_calendar(img, stroke_width=stroke_width, **params)
 
 class CalendarApp:
     def __init__(self, master):
         self.master = master
         master.title("Tapezieren V1.1")
 
-        self.fonts = get_available_fonts()
-        if not self.fonts:
-            self.fonts = ["default"]
+        # Start from the catalog saved by the last launch and rescan the fonts in the background,
+        # so the window does not wait for every system font to be opened. Without a saved
+        # catalog the index starts empty and previews use the default font until the scan is
+        # done, rather than blocking the Tk thread on it.
+        build_font_index(fontcatalog.load_cached() or {})
+        self.fonts = get_available_fonts() or ["default"]
+        self.font_scan = fontcatalog.refresh_async()
 
         self.setup_variables()
         self.create_gui_elements()
         self.image_paths = []
         self.current_image_index = 0
+        self.preview_cache = PreviewCache(PREVIEW_SIZE)
+        self.batch_thread = None
 
         # Bind all variable changes to update_preview
         self.bind_variables()
+        self.master.after(100, self.poll_font_scan)
+
+    def poll_font_scan(self):
+        if not self.font_scan.done():
+            self.master.after(100, self.poll_font_scan)
+            return
+        try:
+            build_font_index(self.font_scan.result())
+        except Exception as e:
+            print(f"Failed to scan fonts: {e}")
+            return
+        # Overlays drawn with the fonts of the old index are stale now
+        clear_overlay_cache()
+        fonts = get_available_fonts()
+        if fonts:
+            self.fonts = fonts
+            self.font_dropdown.configure(values=self.fonts)
+            if self.font_var.get() not in self.fonts:
+                self.font_dropdown.set(self.fonts[0])
+        self.schedule_preview_update()
 
     def setup_variables(self):
         self.font_var = tk.StringVar(self.master)
@@ -167,6 +188,7 @@ class CalendarApp:
         current_date = datetime.now()
         self.month_var = tk.IntVar(self.master, value=current_date.month)
         self.year_var = tk.IntVar(self.master, value=current_date.year)
+        self.month_count_var = tk.IntVar(self.master, value=1)
 
         self.bold_var = tk.BooleanVar(self.master, value=False)
         self.italic_var = tk.BooleanVar(self.master, value=False)
@@ -180,6 +202,48 @@ class CalendarApp:
 
         self.input_folder = ""
         self.output_folder = ""
+        self.workers_var = tk.IntVar(self.master, value=default_workers())
+        self.pipeline_var = tk.BooleanVar(self.master, value=False)
+        self.skip_current_var = tk.BooleanVar(self.master, value=True)
+        self.output_format_var = tk.StringVar(self.master, value=OUTPUT_FORMATS[0])
+        self.preset_var = tk.StringVar(self.master, value=ENCODER_PRESET_NAMES[0])
+        self.dedupe_var = tk.BooleanVar(self.master, value=True)
+
+    def get_calendar_params(self):
+        return dict(
+            font_name=self.font_var.get(),
+            font_color=self.font_color,
+            box_color=self.box_color,
+            weekday_color=self.weekday_color,
+            holiday_color=self.holiday_color,
+            day_name_color=self.day_name_color,
+            transparency=self.transparency_var.get(),
+            curvature=self.curvature_var.get(),
+            table_size=self.table_size_var.get(),
+            x_offset=self.x_offset_var.get(),
+            y_offset=self.y_offset_var.get(),
+            selected_month=self.month_var.get(),
+            selected_year=self.year_var.get(),
+            bold=self.bold_var.get(),
+            italic=self.italic_var.get(),
+            hollow=self.hollow_var.get(),
+        )
+
+    def get_output_settings(self):
+        # (output_format, preset); None means keep the input's format / Pillow's defaults
+        output_format = self.output_format_var.get()
+        preset = self.preset_var.get()
+        return (None if output_format == OUTPUT_FORMATS[0] else output_format,
+                None if preset == ENCODER_PRESET_NAMES[0] else preset)
+
+    def save_settings(self):
+        # watch.py renders images dropped into a folder with the settings of the last run
+        output_format, preset = self.get_output_settings()
+        try:
+            settings.save(dict(params=self.get_calendar_params(), output_format=output_format, preset=preset,
+                               input_folder=self.input_folder, output_folder=self.output_folder))
+        except OSError as e:
+            print(f"Failed to save settings: {e}")
 
     def create_gui_elements(self):
         # Create two main frames - left for controls, right for preview
@@ -201,9 +265,9 @@ class CalendarApp:
         current_row += 1
 
         ttk.Label(font_frame, text="Font:").grid(row=0, column=0, sticky="w", padx=5, pady=5)
-        font_dropdown = ttk.Combobox(font_frame, textvariable=self.font_var, values=self.fonts)
-        font_dropdown.grid(row=0, column=1, padx=5, pady=5, sticky="ew")
-        font_dropdown.set(self.fonts[0])
+        self.font_dropdown = ttk.Combobox(font_frame, textvariable=self.font_var, values=self.fonts)
+        self.font_dropdown.grid(row=0, column=1, padx=5, pady=5, sticky="ew")
+        self.font_dropdown.set(self.fonts[0])
 
         # Font style checkboxes
         style_frame = ttk.Frame(font_frame)
@@ -230,6 +294,11 @@ class CalendarApp:
         year_spinbox = ttk.Spinbox(date_frame, from_=1900, to=2100, textvariable=self.year_var)
         year_spinbox.grid(row=1, column=1, padx=5, pady=5, sticky="ew")
 
+        # More than one month writes calendar_<yyyy>-<mm>_<name> per month, starting at the month above
+        ttk.Label(date_frame, text="Months:").grid(row=2, column=0, sticky="w", padx=5, pady=5)
+        month_count_spinbox = ttk.Spinbox(date_frame, from_=1, to=24, textvariable=self.month_count_var)
+        month_count_spinbox.grid(row=2, column=1, padx=5, pady=5, sticky="ew")
+
         # Color settings
         color_frame = ttk.LabelFrame(left_frame, text="Color Settings")
         color_frame.grid(row=current_row, column=0, padx=5, pady=5, sticky="ew")
@@ -270,6 +339,25 @@ class CalendarApp:
         ttk.Button(folder_frame, text="Select Output Folder",
                    command=self.choose_output_folder).grid(row=0, column=1, padx=5, pady=5)
 
+        ttk.Label(folder_frame, text="Workers:").grid(row=1, column=0, sticky="w", padx=5, pady=5)
+        ttk.Spinbox(folder_frame, from_=1, to=default_workers(), textvariable=self.workers_var,
+                    width=5).grid(row=1, column=1, sticky="w", padx=5, pady=5)
+        # The pipeline writes one output per image, so runs over several months, which write
+        # every month from one decode, always use the worker processes
+        self.pipeline_check = ttk.Checkbutton(folder_frame, variable=self.pipeline_var,
+                                              text="Streaming pipeline (overlap disk I/O and drawing; one month only)")
+        self.pipeline_check.grid(row=2, column=0, columnspan=2, sticky="w", padx=5, pady=5)
+        ttk.Checkbutton(folder_frame, text="Skip images that are already up to date",
+                        variable=self.skip_current_var).grid(row=3, column=0, columnspan=2, sticky="w", padx=5, pady=5)
+        ttk.Label(folder_frame, text="Output format:").grid(row=4, column=0, sticky="w", padx=5, pady=5)
+        ttk.Combobox(folder_frame, textvariable=self.output_format_var, values=OUTPUT_FORMATS,
+                     state="readonly", width=14).grid(row=4, column=1, sticky="w", padx=5, pady=5)
+        ttk.Label(folder_frame, text="Encoder preset:").grid(row=5, column=0, sticky="w", padx=5, pady=5)
+        ttk.Combobox(folder_frame, textvariable=self.preset_var, values=ENCODER_PRESET_NAMES,
+                     state="readonly", width=14).grid(row=5, column=1, sticky="w", padx=5, pady=5)
+        ttk.Checkbutton(folder_frame, text="Render identical images only once (link the copies)",
+                        variable=self.dedupe_var).grid(row=6, column=0, columnspan=2, sticky="w", padx=5, pady=5)
+
         # Preview and Process buttons
         button_frame = ttk.Frame(left_frame)
         button_frame.grid(row=current_row, column=0, padx=5, pady=5, sticky="ew")
@@ -283,11 +371,19 @@ class CalendarApp:
                                          command=self.process_images)
         self.process_button.grid(row=0, column=1, padx=5, pady=10)
 
-        # Processing status
+        self.cancel_button = ttk.Button(button_frame, text="Cancel", command=self.cancel_batch,
+                                        state=tk.DISABLED)
+        self.cancel_button.grid(row=0, column=2, padx=5, pady=10)
+
+        # Processing status and the images that failed
         self.status_label = ttk.Label(left_frame, text="")
         self.status_label.grid(row=current_row, column=0, padx=5, pady=5, sticky="ew")
         current_row += 1
 
+        self.error_list = tk.Listbox(left_frame, height=4)
+        self.error_list.grid(row=current_row, column=0, padx=5, pady=5, sticky="ew")
+        current_row += 1
+
         # Preview area - now on the right side
         preview_frame = ttk.LabelFrame(right_frame, text="Preview")
         preview_frame.grid(row=0, column=0, padx=5, pady=5, sticky="nsew")
@@ -318,6 +414,15 @@ class CalendarApp:
         self.bold_var.trace_add("write", lambda *args: self.schedule_preview_update())
         self.italic_var.trace_add("write", lambda *args: self.schedule_preview_update())
         self.hollow_var.trace_add("write", lambda *args: self.schedule_preview_update())
+        self.month_count_var.trace_add("write", lambda *args: self.update_pipeline_state())
+
+    def update_pipeline_state(self):
+        try:
+            several_months = self.month_count_var.get() > 1
+        except tk.TclError:
+            # Mid-edit, e.g. an empty spinbox
+            return
+        self.pipeline_check.config(state=tk.DISABLED if several_months else tk.NORMAL)
 
     def schedule_preview_update(self):
         # Cancel any existing scheduled update
@@ -351,10 +456,8 @@ class CalendarApp:
         folder = filedialog.askdirectory(title="Select Input Folder")
         if folder:
             self.input_folder = folder
-            self.image_paths = [
-                os.path.join(folder, f) for f in os.listdir(folder)
-                if f.lower().endswith(('.png', '.jpg', '.jpeg'))
-            ]
+            self.preview_cache.clear()
+            self.image_paths = list_images(folder)
             if self.image_paths:
                 self.current_image_index = 0
                 self.update_preview()
@@ -375,89 +478,234 @@ class CalendarApp:
         if not self.image_paths:
             return
 
-        temp_output_path = os.path.join(os.path.dirname(self.image_paths[0]), "temp_preview.png")
-
-        success = add_calendar(
-            self.image_paths[self.current_image_index],
-            temp_output_path,
-            self.font_var.get(),
-            self.font_color,
-            self.box_color,
-            self.weekday_color,
-            self.holiday_color,
-            self.day_name_color,
-            self.transparency_var.get(),
-            self.curvature_var.get(),
-            self.table_size_var.get(),
-            self.x_offset_var.get(),
-            self.y_offset_var.get(),
-            self.month_var.get(),
-            self.year_var.get(),
-            self.bold_var.get(),
-            self.italic_var.get(),
-            self.hollow_var.get()
-        )
+        image_path = self.image_paths[self.current_image_index]
+        try:
+            preview_img = render_preview(image_path, PREVIEW_SIZE, cache=self.preview_cache,
+                                         **self.get_calendar_params())
+        except Exception as e:
+            print(f"Failed to preview {image_path}: {e}")
+            return
 
-        if success:
-            preview_img = Image.open(temp_output_path)
-            # Calculate aspect ratio for resizing
-            width, height = preview_img.size
-            max_size = (600, 800)  # Increased preview size
-            ratio = min(max_size[0] / width, max_size[1] / height)
-            new_size = (int(width * ratio), int(height * ratio))
-            preview_img = preview_img.resize(new_size, Image.Resampling.LANCZOS)
-            photo = ImageTk.PhotoImage(preview_img)
+        # Decode the next few images in the background so stepping through them is instant
+        count = min(PREFETCH_COUNT, len(self.image_paths) - 1)
+        self.preview_cache.prefetch([
+            self.image_paths[(self.current_image_index + offset) % len(self.image_paths)]
+            for offset in range(1, count + 1)
+        ])
 
-            self.preview_label.configure(image=photo)
-            self.preview_label.image = photo  # Keep a reference!
-
-            try:
-                os.remove(temp_output_path)
-            except:
-                pass
+        photo = ImageTk.PhotoImage(preview_img)
+        self.preview_label.configure(image=photo)
+        self.preview_label.image = photo  # Keep a reference!
 
     def process_images(self):
         if not self.input_folder or not self.output_folder:
             messagebox.showerror("Error", "Please select both input and output folders.")
             return
+        if self.batch_thread is not None:
+            return
+        self.save_settings()
+
+        if self.month_count_var.get() > 1:
+            self.process_months()
+            return
+
+        output_format, preset = self.get_output_settings()
+        jobs = [(image_path, output_path_for(self.output_folder, image_path, output_format=output_format))
+                for image_path in self.image_paths]
+
+        # The manifest in the output folder records what each output was rendered from,
+        # so re-runs only render new or changed inputs and resume after an interruption
+        params = self.get_calendar_params()
+        manifest = RenderManifest(self.output_folder)
+        digest = params_hash(dict(params, preset=preset) if preset else params)
+        if self.skip_current_var.get():
+            jobs = manifest.pending(jobs, digest)
+        skipped = len(self.image_paths) - len(jobs)
+        # Byte-identical inputs are rendered once; the others get a link to that output
+        copies = []
+        if self.dedupe_var.get():
+            jobs, copies = dedup.plan(jobs, digest)
+        use_pipeline = self.pipeline_var.get()
+        workers = self.workers_var.get()
+
+        def record(result):
+            manifest.record(result.image_path, result.output_path, digest)
+
+        def run(progress, cancel):
+            if use_pipeline:
+                outputs = dict(jobs)
+                return run_pipeline(jobs, partial(draw_calendar_strips, **params),
+                                    lambda image_path: load_image_for_output(image_path, outputs[image_path]),
+                                    partial(save_image, preset=preset), progress=progress, cancel=cancel)
+            return run_batch(render_calendar, jobs, kwargs=dict(params, preset=preset), workers=workers,
+                             progress=progress, cancel=cancel, mp_context=thread_safe_context())
+
+        def finish(results):
+            created = dedup.materialize(copies, {result.output_path for result in results if result.success})
+            for image_path, output_path in created:
+                manifest.record(image_path, output_path, digest)
+            return dedup.describe(dedup.report(copies, created))
+
+        self.start_batch(run, manifest, record, len(jobs), skipped, finish=finish)
+
+    def process_months(self):
+        # One job per image: each image is decoded once and written out for every month
+        params = self.get_calendar_params()
+        output_format, preset = self.get_output_settings()
+        months = month_range(params.pop("selected_month"), params.pop("selected_year"),
+                             self.month_count_var.get())
+        # Each month's output gets the same digest a single-month run would give it
+        digests = {}
+        for year, month in months:
+            month_params = dict(params, selected_month=month, selected_year=year)
+            digests[year, month] = params_hash(dict(month_params, preset=preset) if preset else month_params)
+        manifest = RenderManifest(self.output_folder)
+
+        def month_outputs(image_path):
+            return [(month_output_path(self.output_folder, image_path, year, month, output_format),
+                     digests[year, month]) for year, month in months]
+
+        image_paths = self.image_paths
+        if self.skip_current_var.get():
+            image_paths = [image_path for image_path in image_paths
+                           if not all(manifest.is_current(image_path, output_path, digest)
+                                      for output_path, digest in month_outputs(image_path))]
+        skipped = len(self.image_paths) - len(image_paths)
+        # Byte-identical inputs are rendered once; the others get links to each month's output
+        copies = []
+        copy_digests = {}
+        if self.dedupe_var.get():
+            unique, first_month_copies = dedup.plan(
+                [(image_path, month_outputs(image_path)[0][0]) for image_path in image_paths])
+            primaries = {output_path: image_path for image_path, output_path in unique}
+            for image_path, _, primary_output in first_month_copies:
+                for (output_path, digest), (month_primary, _) in zip(month_outputs(image_path),
+                                                                     month_outputs(primaries[primary_output])):
+                    copies.append((image_path, output_path, month_primary))
+                    copy_digests[output_path] = digest
+            image_paths = [image_path for image_path, _ in unique]
+        jobs = [(image_path, self.output_folder) for image_path in image_paths]
+        kwargs = dict(params, selected_month=months[0][1], selected_year=months[0][0],
+                      month_count=len(months), preset=preset, output_format=output_format)
+        workers = self.workers_var.get()
+
+        def record(result):
+            for output_path, digest in month_outputs(result.image_path):
+                manifest.record(result.image_path, output_path, digest)
+
+        def run(progress, cancel):
+            return run_batch(add_calendar_months, jobs, kwargs=kwargs, workers=workers,
+                             progress=progress, cancel=cancel, mp_context=thread_safe_context())
+
+        def finish(results):
+            rendered = {output_path for result in results if result.success
+                        for output_path, _ in month_outputs(result.image_path)}
+            created = dedup.materialize(copies, rendered)
+            for image_path, output_path in created:
+                manifest.record(image_path, output_path, copy_digests[output_path])
+            stats = dedup.report(copies, created)
+            # Each duplicate was not decoded once, not once per month
+            stats["input_bytes_skipped"] = dedup.report(copies, dict(created).items())["input_bytes_skipped"]
+            return dedup.describe(stats)
+
+        self.start_batch(run, manifest, record, len(jobs), skipped, f" x {len(months)} months", finish=finish)
+
+    def start_batch(self, run, manifest, record, total_images, skipped, unit="", finish=None):
+        # Runs run(progress, cancel) on a worker thread. Everything that touches Tk stays on
+        # this thread: the worker only posts messages to a queue that poll_batch drains.
+        # record(result) stores each successful result in the manifest, on the worker thread;
+        # finish(results), if given, runs there afterwards and returns text for the status.
+        self.batch_queue = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.batch_started = time.perf_counter()
+        self.error_list.delete(0, tk.END)
+
+        def progress(done, total, result):
+            if result.success:
+                record(result)
+            self.batch_queue.put(("progress", done, total, result))
+
+        def work():
+            results, error, summary = [], None, ""
+            try:
+                results = run(progress, self.cancel_event)
+                if finish is not None:
+                    summary = finish(results)
+            except Exception as e:
+                error = e
+            finally:
+                manifest.save()
+            if profiling.REPORT_PATH:
+                profiling.write_report(profiling.REPORT_PATH)
+            self.batch_queue.put(("done", results, error, summary))
+
+        self.process_button.config(state=tk.DISABLED)
+        self.cancel_button.config(state=tk.NORMAL)
+        self.status_label.config(text=f"Processing 0 of {total_images} images{unit}")
+        self.batch_thread = threading.Thread(target=work, daemon=True)
+        self.batch_thread.start()
+        self.master.after(100, self.poll_batch, total_images, skipped, unit)
+
+    def cancel_batch(self):
+        if self.batch_thread is not None:
+            self.cancel_event.set()
+            self.cancel_button.config(state=tk.DISABLED)
+            self.status_label.config(text="Cancelling, finishing the images in progress...")
+
+    def poll_batch(self, total_images, skipped, unit):
+        finished = None
+        while True:
+            try:
+                message = self.batch_queue.get_nowait()
+            except queue.Empty:
+                break
+            if message[0] == "done":
+                finished = message
+                break
+            _, done, total, result = message
+            if not result.success:
+                self.error_list.insert(tk.END, f"{os.path.basename(result.image_path)}: {result.error}")
+            if not self.cancel_event.is_set():
+                elapsed = time.perf_counter() - self.batch_started
+                rate = done / elapsed if elapsed > 0 else 0
+                eta = f", about {format_duration((total - done) / rate)} left" if rate else ""
+                self.status_label.config(
+                    text=f"Processing {done} of {total} images{unit}, {rate:.1f} images/s{eta}")
+
+        if finished is None:
+            self.master.after(100, self.poll_batch, total_images, skipped, unit)
+            return
 
-        total_images = len(self.image_paths)
-        for index, image_path in enumerate(self.image_paths, start=1):
-            self.status_label.config(text=f"Processing {index} of {total_images} images")
-            self.master.update()
-
-            output_filename = f"calendar_{os.path.basename(image_path)}"
-            output_path = os.path.join(self.output_folder, output_filename)
-
-            success = add_calendar(
-                image_path,
-                output_path,
-                self.font_var.get(),
-                self.font_color,
-                self.box_color,
-                self.weekday_color,
-                self.holiday_color,
-                self.day_name_color,
-                self.transparency_var.get(),
-                self.curvature_var.get(),
-                self.table_size_var.get(),
-                self.x_offset_var.get(),
-                self.y_offset_var.get(),
-                self.month_var.get(),
-                self.year_var.get(),
-                self.bold_var.get(),
-                self.italic_var.get(),
-                self.hollow_var.get()
-            )
-
-            if not success:
-                messagebox.showerror("Error", f"Failed to process {os.path.basename(image_path)}")
-                self.status_label.config(text="")
-                return
-
-        self.status_label.config(text=f"Processed {total_images} images")
+        _, results, error, summary = finished
+        self.batch_thread = None
+        self.process_button.config(state=tk.NORMAL)
+        self.cancel_button.config(state=tk.DISABLED)
+        if error is not None:
+            messagebox.showerror("Error", f"Processing stopped: {error}")
+
+        skipped_text = f", skipped {skipped} up to date" if skipped else ""
+        failed = [os.path.basename(result.image_path) for result in results if not result.success]
+        processed = len(results) - len(failed)
+        if self.cancel_event.is_set():
+            self.status_label.config(
+                text=f"Cancelled after {processed} of {total_images} images{unit}{skipped_text}{summary}")
+        else:
+            self.status_label.config(
+                text=f"Processed {processed} of {total_images} images{unit}{skipped_text}{summary}")
+        if failed:
+            messagebox.showerror("Error", f"Failed to process {len(failed)} of {total_images} images:\n"
+                                          + "\n".join(failed[:20]))
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}h {minutes:02d}m"
+    if minutes:
+        return f"{minutes}m {seconds:02d}s"
+    return f"{seconds}s"
 
 if __name__ == "__main__":
     root = tk.Tk()
     app = CalendarApp(root)
-    root.mainloop()
\ No newline at end of file
+    root.mainloop()
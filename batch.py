@@ -0,0 +1,228 @@
+import os
+from collections import namedtuple
+
+import profiling
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+
+# Encoder settings per output format; None (the default) keeps Pillow's defaults.
+# PNG compression is the slowest part of writing large PNGs, "fast" trades file size for it.
+ENCODER_PRESETS = {
+    "fast": {
+        "jpeg": {"quality": 85},
+        "png": {"compress_level": 1},
+        "webp": {"quality": 85, "method": 0},
+    },
+    "balanced": {
+        "jpeg": {"quality": 90, "optimize": True},
+        "png": {"compress_level": 6},
+        "webp": {"quality": 90, "method": 4},
+    },
+    "small": {
+        "jpeg": {"quality": 85, "optimize": True, "progressive": True},
+        "png": {"compress_level": 9, "optimize": True},
+        "webp": {"quality": 80, "method": 6},
+    },
+}
+_FORMATS = {'.jpg': "jpeg", '.jpeg': "jpeg", '.png': "png", '.webp': "webp"}
+# Metadata carried over from the source image when the output format can store it
+_METADATA_KEYS = ("exif", "icc_profile")
+_ORIENTATION_TAG = 0x0112
+# Data color space signature in bytes 16-20 of an ICC profile header
+_ICC_RGB = b"RGB "
+
+# profile holds the worker's profiling samples when profiling is enabled
+BatchResult = namedtuple("BatchResult", ["image_path", "output_path", "success", "error", "profile"],
+                         defaults=(None,))
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+def list_images(folder):
+    return sorted(
+        os.path.join(folder, f) for f in os.listdir(folder)
+        if f.lower().endswith(IMAGE_EXTENSIONS)
+    )
+
+
+def output_path_for(output_folder, image_path, prefix="calendar_", output_format=None):
+    # output_format ("png", "jpg", "webp") replaces the input's extension
+    name = os.path.basename(image_path)
+    if output_format:
+        name = f"{os.path.splitext(name)[0]}.{output_format.lower().lstrip('.')}"
+    return os.path.join(output_folder, f"{prefix}{name}")
+
+
+def save_options(output_path, preset=None, info=None):
+    # Keyword arguments for Image.save: the preset's settings for the output's format plus
+    # EXIF and ICC data from the source image's info
+    image_format = _FORMATS.get(os.path.splitext(output_path)[1].lower())
+    options = {}
+    if preset is not None:
+        if preset not in ENCODER_PRESETS:
+            raise ValueError(f"Unknown encoder preset {preset!r}, expected one of {', '.join(ENCODER_PRESETS)}")
+        options.update(ENCODER_PRESETS[preset].get(image_format, {}))
+    for key in _METADATA_KEYS:
+        if info and info.get(key):
+            options[key] = info[key]
+    if "exif" in options:
+        options["exif"] = _upright_exif(options["exif"])
+    # Outputs are always RGB(A): a gray or CMYK source's profile would describe the wrong
+    # color space once its pixels were converted, so only RGB profiles are carried over
+    if "icc_profile" in options and options["icc_profile"][16:20] != _ICC_RGB:
+        del options["icc_profile"]
+    return options
+
+
+def _upright_exif(exif_bytes):
+    # The calendar is drawn on the stored pixels, so an Orientation tag carried over from
+    # the source would make viewers rotate the finished image, calendar and all
+    from PIL import Image
+    exif = Image.Exif()
+    exif.load(exif_bytes)
+    if exif.get(_ORIENTATION_TAG, 1) == 1:
+        return exif_bytes
+    exif[_ORIENTATION_TAG] = 1
+    return exif.tobytes()
+
+
+def _init_worker(profile):
+    # Forked workers inherit the parent's profiling state and samples; start clean
+    profiling.reset()
+    if profile:
+        profiling.enable()
+    else:
+        profiling.disable()
+
+
+def thread_safe_context():
+    # For pools started while other threads run (e.g. in the GUI): forking copies locks those
+    # threads may hold, which can deadlock the workers. forkserver forks from a separate
+    # single-threaded process instead; spawn where that is not available.
+    import multiprocessing
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return multiprocessing.get_context(method)
+
+
+def _run_job(func, image_path, output_path, args, kwargs, profile=False):
+    # Never let an exception take down the whole batch. Returns the job's BatchResults: one,
+    # or one per image when func handles a group of images and returns their BatchResults
+    # itself (see add_sticker_stack). With profile=True this runs in a pool worker and ships
+    # its samples back with the first result.
+    try:
+        outcome = func(image_path, output_path, *args, **kwargs)
+    except Exception as e:
+        results = [BatchResult(image_path, output_path, False, str(e))]
+    else:
+        if isinstance(outcome, list):
+            results = outcome
+        elif outcome is False:
+            results = [BatchResult(image_path, output_path, False, "render failed")]
+        else:
+            results = [BatchResult(image_path, output_path, True, None)]
+        profiling.count("images", sum(result.success for result in results))
+    if profile and results:
+        results[0] = results[0]._replace(profile=profiling.drain())
+    return results
+
+
+def _run_chunk(func, chunk, args, kwargs, profile=False):
+    return [_run_job(func, image_path, output_path, args, kwargs, profile) for image_path, output_path in chunk]
+
+
+def run_batch(func, jobs, args=(), kwargs=None, workers=None, progress=None, chunk_size=1, cancel=None,
+              group=None, mp_context=None):
+    # Calls func(image_path, output_path, *args, **kwargs) for every (image_path, output_path)
+    # in jobs on a process pool. func must be a module-level function so it can be pickled.
+    # progress(done, total, result) is called in the calling process as each job finishes,
+    # once per result for jobs that report several images.
+    # For grouped jobs, which cover several outputs and return a BatchResult for each,
+    # group(image_path, output_path) lists the job's (image_path, output_path) pairs; a job
+    # that fails as a whole (e.g. its worker died) then gets a failed result for every pair.
+    # With chunk_size > 1, runs of consecutive jobs go to one worker together, which cuts
+    # per-task overhead and lets jobs that share work (e.g. same image size) hit its caches.
+    # Setting the cancel event stops after the jobs already handed to workers; the results
+    # then only cover the jobs that ran. mp_context picks how workers are started, see
+    # thread_safe_context.
+    jobs = list(jobs)
+    kwargs = kwargs or {}
+    workers = workers or default_workers()
+    total = len(jobs)
+    results = [None] * total
+
+    def cancelled():
+        return cancel is not None and cancel.is_set()
+
+    if workers <= 1 or total <= 1:
+        for index, (image_path, output_path) in enumerate(jobs):
+            if cancelled():
+                break
+            results[index] = _expand_failure(_run_job(func, image_path, output_path, args, kwargs),
+                                             image_path, output_path, group)
+            if progress:
+                for result in results[index]:
+                    progress(index + 1, total, result)
+        return _flatten(results)
+
+    chunk_size = max(1, chunk_size)
+    starts = list(range(0, total, chunk_size))
+    profile = profiling.is_enabled()
+    workers = min(workers, total)
+    # Only a couple of chunks per worker are queued at a time, so cancelling takes effect quickly
+    max_pending = workers * 2
+    # Imported here so that render.py and the worker processes, which only need the helpers
+    # above, do not load multiprocessing
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context, initializer=_init_worker,
+                             initargs=(profile,)) as executor:
+        pending = {}
+        done = 0
+        while starts or pending:
+            while starts and len(pending) < max_pending and not cancelled():
+                start = starts.pop(0)
+                chunk = jobs[start:start + chunk_size]
+                pending[executor.submit(_run_chunk, func, chunk, args, kwargs, profile)] = start
+            if not pending:
+                break
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                start = pending.pop(future)
+                chunk = jobs[start:start + chunk_size]
+                try:
+                    chunk_results = future.result()
+                except Exception as e:
+                    # The worker process itself died (e.g. out of memory)
+                    chunk_results = [[BatchResult(image_path, output_path, False, str(e))]
+                                     for image_path, output_path in chunk]
+                for offset, job_results in enumerate(chunk_results):
+                    job_results = _expand_failure(job_results, *chunk[offset], group)
+                    results[start + offset] = job_results
+                    done += 1
+                    for result in job_results:
+                        # Fold the worker's stage timings into this process's profile
+                        profiling.merge(result.profile)
+                        if progress:
+                            progress(done, total, result)
+    return _flatten(results)
+
+
+def _expand_failure(job_results, image_path, output_path, group):
+    if group is None or len(job_results) != 1:
+        return job_results
+    failure = job_results[0]
+    if failure.success or failure.image_path != image_path or failure.output_path != output_path:
+        return job_results
+    expanded = [BatchResult(item_image_path, item_output_path, False, failure.error)
+                for item_image_path, item_output_path in group(image_path, output_path)]
+    if not expanded:
+        return job_results
+    # The worker's profiling samples stay with the first result
+    expanded[0] = expanded[0]._replace(profile=failure.profile)
+    return expanded
+
+
+def _flatten(results):
+    # The results of the jobs that ran, in job order
+    return [result for job_results in results if job_results is not None for result in job_results]
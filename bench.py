@@ -0,0 +1,248 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import PIL
+from PIL import Image
+
+RESOLUTIONS = {
+    "1080p": (1920, 1080),
+    "4k": (3840, 2160),
+    "8k": (7680, 4320),
+    "phone": (1170, 2532),
+}
+FORMATS = {"png": ".png", "jpeg": ".jpg"}
+# Results go to the cache folder by default, not into the working tree
+BENCH_PATH = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+                          "tapezieren", "bench.json")
+
+CALENDAR_PARAMS = dict(
+    font_name="DejaVu Sans",
+    font_color=(255, 255, 255),
+    box_color=(0, 0, 0),
+    weekday_color=(200, 200, 200),
+    holiday_color=(255, 100, 100),
+    day_name_color=(150, 150, 150),
+    transparency=0.5,
+    curvature=20,
+    table_size=1.0,
+    x_offset=0.5,
+    y_offset=0.5,
+    selected_month=3,
+    selected_year=2027,
+)
+
+
+def make_wallpaper(size, path):
+    # Gradient plus noise so the encoders see something closer to a photo than a flat fill
+    gradient = Image.linear_gradient("L").resize(size)
+    noise = Image.effect_noise(size, 40)
+    img = Image.merge("RGB", (gradient, noise, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+    img.save(path)
+
+
+def make_sticker(path):
+    sticker = Image.radial_gradient("L").resize((512, 512))
+    Image.merge("RGBA", (sticker, sticker, sticker, sticker.point(lambda v: 255 - v))).save(path)
+
+
+def timed(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def summarize(case, stage, samples):
+    return {
+        "case": case,
+        "stage": stage,
+        "repeat": len(samples),
+        "min_s": min(samples),
+        "median_s": statistics.median(samples),
+        "mean_s": statistics.fmean(samples),
+    }
+
+
+def bench_imports(repeat):
+    # A fresh interpreter importing the rendering module, as a worker or CLI tool does,
+    # against one importing the calendar GUI
+    def importer(module):
+        return lambda: subprocess.run([sys.executable, "-c", f"import {module}"], check=True,
+                                      cwd=os.path.dirname(os.path.abspath(__file__)))
+
+    return [summarize("imports", "import_render", timed(importer("render"), repeat)),
+            summarize("imports", "import_gui", timed(importer("Tapezieren"), repeat))]
+
+
+def bench_fonts(repeat):
+    import itertools
+
+    import fontcatalog
+    import render
+
+    def new_launch():
+        # Drop this process's font catalog and index
+        fontcatalog.reset()
+        render.reset_font_index()
+
+    def lookup():
+        render.get_font(CALENDAR_PARAMS["font_name"], 54)
+
+    saved_catalog_path = fontcatalog.CATALOG_PATH
+    with tempfile.TemporaryDirectory() as tmp:
+        runs = itertools.count()
+
+        def cold():
+            # First launch: no catalog on disk, so every font is opened
+            fontcatalog.CATALOG_PATH = os.path.join(tmp, f"fonts-{next(runs)}.json")
+            new_launch()
+            lookup()
+
+        def cached():
+            # Later launches: the catalog saved by the last scan is reused
+            new_launch()
+            lookup()
+
+        try:
+            results = [summarize("fonts", "font_lookup_cold", timed(cold, repeat)),
+                       summarize("fonts", "font_lookup_cached", timed(cached, repeat))]
+        finally:
+            fontcatalog.CATALOG_PATH = saved_catalog_path
+    return results + [summarize("fonts", "font_lookup_warm", timed(lookup, repeat))]
+
+
+def bench_calendar(case, image_path, output_path, repeat):
+    import render
+    from textcache import get_label
+
+    img = render.load_image(image_path)
+    patch, origin = render.render_calendar_overlay(img.size, **CALENDAR_PARAMS)
+    composited = img.copy()
+    composited.alpha_composite(patch, dest=origin)
+    work = img.copy()
+
+    def draw():
+        # Cold label cache, so this is the full cost of rasterizing a calendar
+        get_label.cache_clear()
+        render.render_calendar_overlay(img.size, **CALENDAR_PARAMS)
+
+    def end_to_end():
+        render.add_calendar(image_path, output_path, **CALENDAR_PARAMS)
+
+    return [
+        summarize(case, "decode", timed(lambda: render.load_image(image_path), repeat)),
+        summarize(case, "draw", timed(draw, repeat)),
+        summarize(case, "composite", timed(lambda: work.alpha_composite(patch, dest=origin), repeat)),
+        summarize(case, "encode", timed(lambda: render.save_image(composited, output_path), repeat)),
+        summarize(case, "add_calendar", timed(end_to_end, repeat)),
+    ]
+
+
+def bench_text_calendar(case, image_path, output_path, font_path, repeat):
+    import render
+
+    def run():
+        # add_text_calendar reports every saved file on stdout
+        with contextlib.redirect_stdout(io.StringIO()):
+            render.add_text_calendar(image_path, output_path, font_path, 40, (255, 255, 255), (0, 0, 0, 128), 20,
+                                         CALENDAR_PARAMS["selected_year"], CALENDAR_PARAMS["selected_month"])
+
+    return [summarize(case, "text_calendar", timed(run, repeat))]
+
+
+def bench_sticker(case, image_path, output_path, sticker_path, repeat):
+    import render
+
+    def run():
+        render.add_sticker(image_path, output_path, sticker_path, 0.1, 0.5, 0.5)
+
+    def run_stacked():
+        render.add_sticker_stack(image_path, [(image_path, output_path)], sticker_path, 0.1, 0.5, 0.5)
+
+    results = [summarize(case, "sticker", timed(run, repeat))]
+    if render.has_numpy():
+        results.append(summarize(case, "sticker_numpy", timed(run_stacked, repeat)))
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline, current):
+    # Prints median ratios current/baseline per (case, stage); < 1.0 means faster
+    old = {(r["case"], r["stage"]): r["median_s"] for r in baseline["results"]}
+    for result in current["results"]:
+        key = (result["case"], result["stage"])
+        if key in old and old[key] > 0:
+            ratio = result["median_s"] / old[key]
+            print(f"{key[0]:>14} {key[1]:>18} {old[key] * 1000:10.2f} ms -> "
+                  f"{result['median_s'] * 1000:10.2f} ms  x{ratio:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the calendar and sticker render paths.")
+    parser.add_argument("--resolutions", nargs="+", default=list(RESOLUTIONS), choices=list(RESOLUTIONS))
+    parser.add_argument("--formats", nargs="+", default=list(FORMATS), choices=list(FORMATS))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default=BENCH_PATH,
+                        help=f"where to write the JSON results (default: {BENCH_PATH})")
+    parser.add_argument("--compare", help="earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    import render
+    font_path = render.find_font_path(CALENDAR_PARAMS["font_name"])
+
+    results = bench_imports(args.repeat) + bench_fonts(args.repeat)
+    with tempfile.TemporaryDirectory() as tmp:
+        sticker_path = os.path.join(tmp, "sticker.png")
+        make_sticker(sticker_path)
+        for resolution in args.resolutions:
+            for fmt in args.formats:
+                case = f"{resolution}-{fmt}"
+                extension = FORMATS[fmt]
+                image_path = os.path.join(tmp, f"{case}{extension}")
+                output_path = os.path.join(tmp, f"out-{case}{extension}")
+                make_wallpaper(RESOLUTIONS[resolution], image_path)
+                print(f"Benchmarking {case}...")
+                results += bench_calendar(case, image_path, output_path, args.repeat)
+                results += bench_text_calendar(case, image_path, output_path, font_path, args.repeat)
+                results += bench_sticker(case, image_path, output_path, sticker_path, args.repeat)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "pillow": PIL.__version__,
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=1)
+    print(f"Wrote {len(results)} results to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
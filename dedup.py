@@ -0,0 +1,108 @@
+import os
+import shutil
+from collections import defaultdict
+
+from manifest import file_hash
+
+# Renders each distinct input once. Inputs are compared by size first and only files that
+# share a size with another input are hashed (streamed in chunks), so folders without
+# duplicates cost one stat per file. Duplicates get a hardlink to, or else a copy of, the
+# output rendered for the first file with the same content.
+
+
+def plan(jobs, digest=None):
+    # Splits (image_path, output_path) jobs into the jobs to render and copies, a list of
+    # (image_path, output_path, primary_output_path) for inputs identical to an earlier one.
+    # Jobs only match when the output extension and the settings digest match too.
+    jobs = list(jobs)
+    sizes = {}
+    by_size = defaultdict(list)
+    for image_path, _ in jobs:
+        try:
+            sizes[image_path] = os.path.getsize(image_path)
+        except OSError:
+            continue
+        by_size[sizes[image_path]].append(image_path)
+
+    hashes = {}
+    for paths in by_size.values():
+        if len(set(paths)) > 1:
+            for image_path in paths:
+                if image_path not in hashes:
+                    try:
+                        hashes[image_path] = file_hash(image_path)
+                    except OSError:
+                        pass
+
+    unique = []
+    copies = []
+    primaries = {}
+    for image_path, output_path in jobs:
+        if image_path not in hashes:
+            unique.append((image_path, output_path))
+            continue
+        key = (hashes[image_path], os.path.splitext(output_path)[1].lower(), digest)
+        if key in primaries:
+            copies.append((image_path, output_path, primaries[key]))
+        else:
+            primaries[key] = output_path
+            unique.append((image_path, output_path))
+    return unique, copies
+
+
+def materialize(copies, rendered, link=True):
+    # Creates the duplicates' outputs from the primaries in rendered (the output paths that
+    # were written successfully). Returns the (image_path, output_path) pairs created.
+    created = []
+    for image_path, output_path, primary_output in copies:
+        if primary_output not in rendered:
+            continue
+        try:
+            link_or_copy(primary_output, output_path, link)
+        except OSError as e:
+            print(f"Failed to process {image_path}: {e}")
+            continue
+        created.append((image_path, output_path))
+    return created
+
+
+def link_or_copy(source, target, link=True):
+    if os.path.abspath(source) == os.path.abspath(target):
+        return
+    if os.path.lexists(target):
+        os.remove(target)
+    if link:
+        try:
+            os.link(source, target)
+            return
+        except OSError:
+            # Different file system, or one without hardlinks
+            pass
+    shutil.copyfile(source, target)
+
+
+def unlink_shared(output_path):
+    # Call before writing an output: if it is a hardlink shared with other outputs, writing
+    # in place would change them all, so the link is removed first
+    try:
+        if os.stat(output_path).st_nlink > 1:
+            os.remove(output_path)
+    except FileNotFoundError:
+        pass
+
+
+def report(copies, created):
+    # How much work deduplication saved
+    return {
+        "duplicates": len(copies),
+        "renders_saved": len(created),
+        "input_bytes_skipped": sum(os.path.getsize(image_path) for image_path, _ in created
+                                   if os.path.exists(image_path)),
+    }
+
+
+def describe(stats):
+    if not stats["renders_saved"]:
+        return ""
+    return (f", {stats['renders_saved']} duplicates linked instead of rendered "
+            f"({stats['input_bytes_skipped'] / (1024 * 1024):.1f} MB not decoded)")
@@ -0,0 +1,141 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+from concurrent.futures import Future
+
+from PIL import ImageFont
+
+# Family, style and monospace flag for every system font, saved between launches.
+# Entries are keyed by font file path and reused while the file's mtime and size match,
+# so after the first scan only new or changed fonts are opened.
+CATALOG_VERSION = 1
+CATALOG_PATH = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+                            "tapezieren", "fonts.json")
+
+_lock = threading.Lock()
+_catalog = None
+
+
+FONT_EXTENSIONS = ('.ttf', '.otf', '.ttc')
+
+
+def font_directories():
+    # The standard system and per-user font folders for this platform
+    home = os.path.expanduser("~")
+    if sys.platform == "win32":
+        return [os.path.join(os.environ.get("WINDIR", r"C:\Windows"), "Fonts"),
+                os.path.join(os.environ.get("LOCALAPPDATA", ""), "Microsoft", "Windows", "Fonts")]
+    data_dirs = (os.environ.get("XDG_DATA_DIRS") or "/usr/local/share:/usr/share").split(os.pathsep)
+    directories = [os.path.join(data_dir, "fonts") for data_dir in data_dirs]
+    directories += [os.path.join(os.environ.get("XDG_DATA_HOME") or os.path.join(home, ".local", "share"), "fonts"),
+                    os.path.join(home, ".fonts"), "/usr/X11R6/lib/X11/fonts/TTF", "/usr/X11/lib/X11/fonts"]
+    if sys.platform == "darwin":
+        directories += ["/Library/Fonts", "/Network/Library/Fonts", "/System/Library/Fonts",
+                        os.path.join(home, "Library", "Fonts")]
+    return directories
+
+
+def _system_font_paths():
+    font_paths = set()
+    for directory in font_directories():
+        for folder, _, names in os.walk(directory):
+            font_paths.update(os.path.abspath(os.path.join(folder, name)) for name in names
+                              if name.lower().endswith(FONT_EXTENSIONS))
+    return sorted(font_paths)
+
+
+def _describe(font_path):
+    font = ImageFont.truetype(font_path, 12)
+    family, style = font.getname()
+    widths = {font.getbbox(char)[2] for char in 'il1'}
+    return {"family": family, "style": style or "", "monospace": len(widths) == 1}
+
+
+def load_cached():
+    # The catalog as saved by the last scan, possibly stale; None if there is none yet
+    try:
+        with open(CATALOG_PATH) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get("version") != CATALOG_VERSION:
+        return None
+    return data.get("fonts")
+
+
+def get_catalog(refresh=False):
+    # font path -> {"family", "style", "monospace", "mtime_ns", "size"}; fonts Pillow cannot
+    # open are kept as {"error": True, ...} so they are not retried on every launch
+    global _catalog
+    with _lock:
+        if _catalog is not None and not refresh:
+            return _catalog
+        previous = _catalog if _catalog is not None else load_cached() or {}
+        catalog = {}
+        changed = False
+        for font_path in _system_font_paths():
+            try:
+                stat = os.stat(font_path)
+            except OSError:
+                continue
+            entry = previous.get(font_path)
+            if entry is None or entry.get("mtime_ns") != stat.st_mtime_ns or entry.get("size") != stat.st_size:
+                try:
+                    entry = _describe(font_path)
+                except Exception:
+                    entry = {"error": True}
+                entry.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+                changed = True
+            catalog[font_path] = entry
+        if changed or len(catalog) != len(previous):
+            _save(catalog)
+        _catalog = catalog
+        return catalog
+
+
+def reset():
+    # Forget the catalog loaded in this process; the next get_catalog reads the cache file again
+    global _catalog
+    with _lock:
+        _catalog = None
+
+
+def refresh_async():
+    # Scans on a background thread; returns a Future holding the catalog
+    future = Future()
+
+    def run():
+        try:
+            future.set_result(get_catalog(refresh=True))
+        except Exception as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+
+def fonts(catalog):
+    # (path, entry) for every usable font, in path order
+    return [(font_path, entry) for font_path, entry in sorted(catalog.items()) if not entry.get("error")]
+
+
+def _save(catalog):
+    # Each process writes its own temporary file, so concurrent saves (e.g. from batch
+    # workers) never interleave; the last rename wins
+    tmp_path = None
+    try:
+        os.makedirs(os.path.dirname(CATALOG_PATH), exist_ok=True)
+        with tempfile.NamedTemporaryFile("w", dir=os.path.dirname(CATALOG_PATH), prefix="fonts.",
+                                         suffix=".tmp", delete=False) as f:
+            tmp_path = f.name
+            json.dump({"version": CATALOG_VERSION, "fonts": catalog}, f)
+        os.replace(tmp_path, CATALOG_PATH)
+    except OSError:
+        # A read-only home only costs a rescan next launch
+        if tmp_path is not None:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
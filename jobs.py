@@ -0,0 +1,251 @@
+import argparse
+import glob
+import inspect
+import json
+import os
+from collections import OrderedDict, namedtuple
+
+import profiling
+from batch import ENCODER_PRESETS, BatchResult, run_batch
+from manifest import RenderManifest, params_hash
+from render import get_profile, month_range, render_calendar, render_calendars
+
+# A job file lists entries, each matching input images with a glob and rendering them with
+# one set of calendar settings into an output pattern. JSON, or TOML on Python 3.11+:
+#
+#   [defaults]
+#   font_name = "DejaVu Sans"
+#   box_color = [0, 0, 0]
+#
+#   [[jobs]]
+#   input = "wallpapers/*.jpg"
+#   output = "out/{year}/calendar_{year}-{month:02d}_{name}"
+#   months = 12
+#   preset = "balanced"
+#   params = { selected_month = 1, selected_year = 2027, transparency = 0.6 }
+#
+#   [[jobs]]
+#   input = "wallpapers/*.jpg"
+#   output = "out/{profile}/calendar_{name}"
+#   profiles = ["4k", "1440p", "phone-1080", { name = "tv", width = 1366, height = 768, fit = "fit" }]
+#   params = { selected_month = 1, selected_year = 2027 }
+#
+# Output patterns can use {name} (input file name), {stem}, {ext} (with the dot), {year},
+# {month} and {profile}. Relative paths are relative to the job file. Entries with profiles
+# render each image at every profile's size (see render.DISPLAY_PROFILES) instead of
+# at its own size.
+
+Render = namedtuple("Render", ["output_path", "params", "preset", "profile"], defaults=(None,))
+
+
+def load_job_file(path):
+    with open(path, "rb") as f:
+        try:
+            if path.lower().endswith(".toml"):
+                import tomllib
+                return tomllib.load(f)
+            return json.load(f)
+        except ValueError as e:
+            raise ValueError(f"{path}: {e}")
+
+
+def _calendar_param_names():
+    names = list(inspect.signature(render_calendar).parameters)
+    return set(names) - {"image_path", "output_path", "memory_budget", "preset"}
+
+
+def _is_whole_number(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def plan(job_file):
+    # Expands the job file into {image_path: [Render, ...]}. Every source appears once, with
+    # all of its outputs from every entry, so it is decoded once however many entries match it.
+    data = load_job_file(job_file)
+    if not isinstance(data, dict):
+        raise ValueError(f"{job_file} must hold a table with a jobs list")
+    base = os.path.dirname(os.path.abspath(job_file))
+    defaults = data.get("defaults", {})
+    jobs = data.get("jobs", [])
+    if not isinstance(defaults, dict):
+        raise ValueError(f"{job_file}: defaults must be a table of settings")
+    if not isinstance(jobs, list):
+        raise ValueError(f"{job_file}: jobs must be a list of tables")
+    known = _calendar_param_names()
+    signature = inspect.signature(render_calendar)
+    sources = OrderedDict()
+    outputs = {}
+
+    for number, entry in enumerate(jobs, 1):
+        if not isinstance(entry, dict):
+            raise ValueError(f"job {number} must be a table")
+        if "input" not in entry or "output" not in entry:
+            raise ValueError(f"job {number} needs both input and output")
+        patterns = entry["input"] if isinstance(entry["input"], list) else [entry["input"]]
+        if not patterns or not all(isinstance(pattern, str) for pattern in patterns):
+            raise ValueError(f"job {number}: input must be a glob or a list of globs")
+        if not isinstance(entry["output"], str):
+            raise ValueError(f"job {number}: output must be a path pattern")
+        if not isinstance(entry.get("params", {}), dict):
+            raise ValueError(f"job {number}: params must be a table of settings")
+        month_count = entry.get("months", 1)
+        if not _is_whole_number(month_count) or month_count < 1:
+            raise ValueError(f"job {number}: months must be a whole number of at least 1")
+        params = dict(defaults, **entry.get("params", {}))
+        unknown = set(params) - known
+        if unknown:
+            raise ValueError(f"job {number}: unknown settings {', '.join(sorted(unknown))}")
+        # Missing settings are reported now rather than by every render
+        try:
+            signature.bind(None, None, **params)
+        except TypeError as e:
+            raise ValueError(f"job {number}: {e}")
+        if not _is_whole_number(params["selected_month"]) or not 1 <= params["selected_month"] <= 12:
+            raise ValueError(f"job {number}: selected_month must be from 1 to 12")
+        if not _is_whole_number(params["selected_year"]) or params["selected_year"] < 1:
+            raise ValueError(f"job {number}: selected_year must be a year")
+        preset = entry.get("preset")
+        if preset is not None and preset not in ENCODER_PRESETS:
+            raise ValueError(f"job {number}: preset must be one of {', '.join(ENCODER_PRESETS)}")
+        try:
+            profiles = [get_profile(profile) for profile in entry.get("profiles", [])] or [None]
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"job {number}: invalid profile ({e})")
+
+        image_paths = sorted({os.path.abspath(image_path) for pattern in patterns
+                              for image_path in glob.glob(os.path.join(base, pattern), recursive=True)})
+        months = month_range(params["selected_month"], params["selected_year"], month_count)
+        for image_path in image_paths:
+            name = os.path.basename(image_path)
+            stem, ext = os.path.splitext(name)
+            for year, month in months:
+                for profile in profiles:
+                    try:
+                        output_name = entry["output"].format(name=name, stem=stem, ext=ext, year=year, month=month,
+                                                             profile=profile.name if profile else "")
+                    except KeyError as e:
+                        raise ValueError(f"job {number}: unknown placeholder {{{e.args[0]}}} in output")
+                    except (AttributeError, IndexError, ValueError) as e:
+                        raise ValueError(f"job {number}: invalid output {entry['output']!r} ({e})")
+                    output_path = os.path.join(base, output_name)
+                    if output_path in outputs:
+                        raise ValueError(f"job {number} writes {output_path}, which job {outputs[output_path]} "
+                                         f"already writes")
+                    outputs[output_path] = number
+                    render_params = dict(params, selected_month=month, selected_year=year)
+                    sources.setdefault(image_path, []).append(Render(output_path, render_params, preset, profile))
+    return sources
+
+
+def _digest(render):
+    params = dict(render.params)
+    if render.preset:
+        params["preset"] = render.preset
+    if render.profile:
+        params["profile"] = list(render.profile)
+    return params_hash(params)
+
+
+def _render_source(image_path, renders):
+    for render in renders:
+        os.makedirs(os.path.dirname(render.output_path), exist_ok=True)
+    render_calendars(image_path, renders)
+    return [BatchResult(image_path, render.output_path, True, None) for render in renders]
+
+
+def _render_pairs(image_path, renders):
+    # run_batch's group for _render_source jobs
+    return [(image_path, render.output_path) for render in renders]
+
+
+def run_jobs(job_file, workers=None, force=False, progress=None):
+    # Renders every output in the job file that is not up to date. Returns (results, outputs,
+    # skipped): one BatchResult per output. Each source image is one job, decoded once.
+    sources = plan(job_file)
+    manifests = {}
+
+    def manifest_for(output_path):
+        folder = os.path.dirname(output_path)
+        if folder not in manifests:
+            manifests[folder] = RenderManifest(folder)
+        return manifests[folder]
+
+    jobs = []
+    skipped = 0
+    for image_path, renders in sources.items():
+        if not force:
+            stale = [render for render in renders
+                     if not manifest_for(render.output_path).is_current(image_path, render.output_path,
+                                                                        _digest(render))]
+            skipped += len(renders) - len(stale)
+            renders = stale
+        if renders:
+            jobs.append((image_path, renders))
+    total_outputs = sum(len(renders) for _, renders in jobs)
+    digests = {render.output_path: _digest(render) for _, renders in jobs for render in renders}
+
+    def record_progress(done, total, result):
+        if result.success:
+            manifest_for(result.output_path).record(result.image_path, result.output_path,
+                                                    digests[result.output_path])
+        if progress:
+            progress(done, total, result)
+
+    try:
+        results = run_batch(_render_source, jobs, workers=workers, progress=record_progress, group=_render_pairs)
+    finally:
+        for manifest in manifests.values():
+            if os.path.isdir(os.path.dirname(manifest.path)):
+                manifest.save()
+    return results, total_outputs, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render the calendars described by a JSON or TOML job file.")
+    parser.add_argument("job_file")
+    parser.add_argument("--workers", type=int, default=None, help="parallel processes (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="re-render outputs that are already up to date")
+    parser.add_argument("--dry-run", action="store_true", help="only print what the job file expands to")
+    parser.add_argument("--profile", metavar="REPORT_JSON",
+                        help="time each stage and write a summary (p50/p95, images/sec, peak RSS)")
+    args = parser.parse_args()
+
+    if args.dry_run:
+        try:
+            sources = plan(args.job_file)
+        except (OSError, TypeError, ValueError) as e:
+            print(e)
+            return 2
+        for image_path, renders in sources.items():
+            print(image_path)
+            for render in renders:
+                print(f"  -> {render.output_path}")
+        print(f"{len(sources)} source images, {sum(len(renders) for renders in sources.values())} outputs")
+        return 0
+
+    if args.profile:
+        profiling.enable()
+
+    def report_progress(done, total, result):
+        status = "ok" if result.success else f"failed: {result.error}"
+        print(f"[{done}/{total}] {os.path.basename(result.image_path)} -> {os.path.basename(result.output_path)} "
+              f"{status}")
+
+    try:
+        results, total_outputs, skipped = run_jobs(args.job_file, workers=args.workers, force=args.force,
+                                                   progress=report_progress)
+    except (OSError, TypeError, ValueError) as e:
+        # Unreadable or invalid job files (JSON and TOML decode errors are ValueErrors too)
+        print(e)
+        return 2
+    rendered = sum(result.success for result in results)
+    sources = len({result.image_path for result in results})
+    print(f"Rendered {rendered} of {total_outputs} outputs from {sources} source images, "
+          f"skipped {skipped} up to date")
+    if args.profile:
+        profiling.write_report(args.profile)
+    return 0 if all(result.success for result in results) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,116 @@
+import hashlib
+import json
+import os
+import time
+
+MANIFEST_NAME = ".tapezieren-manifest.json"
+# Bump when rendering changes in a way that should invalidate existing outputs
+MANIFEST_VERSION = 1
+
+# How often recorded results are flushed to disk, so an interrupted run can resume
+SAVE_EVERY = 20
+SAVE_INTERVAL = 2.0
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def params_hash(params):
+    # Stable digest of every render parameter; tuples and lists hash the same
+    encoded = json.dumps({"version": MANIFEST_VERSION, "params": params}, sort_keys=True, default=list)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class RenderManifest:
+    # Records, per output file, which input (mtime/size and optionally content hash) and
+    # which parameters produced it. Stored as JSON next to the outputs.
+    def __init__(self, output_folder, content_hash=False):
+        self.path = os.path.join(output_folder, MANIFEST_NAME)
+        self.content_hash = content_hash
+        self.entries = {}
+        self._signatures = {}
+        self._unsaved = 0
+        self._last_save = time.monotonic()
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            if data.get("version") == MANIFEST_VERSION:
+                self.entries = data.get("outputs", {})
+        except (OSError, ValueError):
+            pass
+
+    def input_signature(self, image_path, previous=None):
+        stat = os.stat(image_path)
+        signature = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        if self.content_hash:
+            if previous and previous.get("sha256") and all(previous.get(k) == v for k, v in signature.items()):
+                # Unchanged size and mtime: trust the stored hash instead of re-reading the file
+                signature["sha256"] = previous["sha256"]
+            else:
+                signature["sha256"] = file_hash(image_path)
+        return signature
+
+    def is_current(self, image_path, output_path, digest):
+        entry = self.entries.get(os.path.basename(output_path)) or {}
+        try:
+            signature = self.input_signature(image_path, entry.get("input"))
+        except OSError:
+            return False
+        self._signatures[image_path] = signature
+        if not entry or entry.get("params") != digest or not os.path.exists(output_path):
+            return False
+        if entry.get("input_path") != os.path.abspath(image_path):
+            return False
+        recorded = entry.get("input") or {}
+        unchanged = all(recorded.get(key) == signature[key] for key in ("size", "mtime_ns"))
+        if self.content_hash:
+            if "sha256" in recorded and signature["sha256"] != recorded["sha256"]:
+                return False
+            if "sha256" not in recorded and not unchanged:
+                return False
+            if signature != recorded:
+                # Same content with a new mtime (e.g. touched or copied), or a hash that was not
+                # recorded yet: remember it so the file is not re-hashed next time
+                entry["input"] = signature
+                self._unsaved += 1
+            return True
+        return unchanged
+
+    def pending(self, jobs, digest):
+        # Jobs whose output is missing, stale or was rendered with other settings
+        return [(image_path, output_path) for image_path, output_path in jobs
+                if not self.is_current(image_path, output_path, digest)]
+
+    def record(self, image_path, output_path, digest):
+        # Prefer the signature taken before rendering: if the input changed meanwhile,
+        # the next run sees a mismatch and renders it again
+        signature = self._signatures.pop(image_path, None)
+        if signature is None:
+            try:
+                signature = self.input_signature(image_path)
+            except OSError:
+                return
+        self.entries[os.path.basename(output_path)] = {
+            "input_path": os.path.abspath(image_path),
+            "input": signature,
+            "params": digest,
+        }
+        self._unsaved += 1
+        if self._unsaved >= SAVE_EVERY or time.monotonic() - self._last_save >= SAVE_INTERVAL:
+            self.save()
+
+    def save(self):
+        data = {"version": MANIFEST_VERSION, "outputs": self.entries}
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+        self._unsaved = 0
+        self._last_save = time.monotonic()
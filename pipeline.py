@@ -0,0 +1,221 @@
+import argparse
+import json
+import os
+import queue
+import threading
+from functools import partial
+
+from batch import ENCODER_PRESETS, BatchResult, list_images, output_path_for
+import dedup
+import profiling
+from manifest import RenderManifest, params_hash
+from render import draw_calendar_strips, load_image_for_output, load_image_native, save_image
+
+# Queue sentinel telling a stage thread to exit
+_STOP = object()
+
+
+def run_pipeline(jobs, render, load, save, readers=2, renderers=1, writers=2, queue_size=4, progress=None,
+                 cancel=None):
+    # Streams (image_path, output_path) jobs through reader -> render -> writer threads.
+    # load(image_path) -> img, render(img) -> img and save(img, output_path) run on their
+    # own threads, so disk reads, drawing and encoding overlap. The bounded queues between
+    # the stages cap how many decoded images are held in memory at once.
+    # progress(done, total, result) is called on the calling thread. Setting the cancel event
+    # stops reading new images; images already read are finished and the results only
+    # cover the jobs that ran.
+    jobs = list(jobs)
+    total = len(jobs)
+    results = [None] * total
+    if not total:
+        return results
+
+    pending = queue.Queue()
+    for index, job in enumerate(jobs):
+        pending.put((index, job))
+    decoded = queue.Queue(maxsize=queue_size)
+    rendered = queue.Queue(maxsize=queue_size)
+    finished = queue.Queue()
+
+    def fail(index, error):
+        image_path, output_path = jobs[index]
+        finished.put((index, BatchResult(image_path, output_path, False, str(error))))
+
+    def read_stage():
+        while True:
+            try:
+                index, (image_path, _) = pending.get_nowait()
+            except queue.Empty:
+                return
+            if cancel is not None and cancel.is_set():
+                finished.put((index, None))
+                continue
+            try:
+                img = load(image_path)
+            except Exception as e:
+                fail(index, e)
+                continue
+            decoded.put((index, img))
+
+    def render_stage():
+        while True:
+            item = decoded.get()
+            if item is _STOP:
+                return
+            index, img = item
+            try:
+                img = render(img)
+            except Exception as e:
+                fail(index, e)
+                continue
+            rendered.put((index, img))
+
+    def write_stage():
+        while True:
+            item = rendered.get()
+            if item is _STOP:
+                return
+            index, img = item
+            image_path, output_path = jobs[index]
+            try:
+                save(img, output_path)
+            except Exception as e:
+                fail(index, e)
+                continue
+            profiling.count("images")
+            finished.put((index, BatchResult(image_path, output_path, True, None)))
+
+    threads = [threading.Thread(target=read_stage, daemon=True) for _ in range(readers)]
+    render_threads = [threading.Thread(target=render_stage, daemon=True) for _ in range(renderers)]
+    write_threads = [threading.Thread(target=write_stage, daemon=True) for _ in range(writers)]
+    for thread in threads + render_threads + write_threads:
+        thread.start()
+
+    # Every job produces exactly one result, whichever stage it finished or failed in,
+    # or None if it was cancelled before being read
+    done = 0
+    for _ in range(total):
+        index, result = finished.get()
+        if result is None:
+            continue
+        results[index] = result
+        done += 1
+        if progress:
+            progress(done, total, result)
+
+    for _ in render_threads:
+        decoded.put(_STOP)
+    for _ in write_threads:
+        rendered.put(_STOP)
+    for thread in threads + render_threads + write_threads:
+        thread.join()
+    return [result for result in results if result is not None]
+
+
+def process_folder(input_folder, output_folder, params, readers=2, renderers=1, writers=2, queue_size=4,
+                   progress=None, force=False, content_hash=False, memory_budget=None, preset=None,
+                   output_format=None, dedupe=False, dedup_stats=None):
+    # dedupe renders byte-identical inputs once and links the other outputs to it; pass a
+    # dict as dedup_stats to receive dedup.report's numbers
+    os.makedirs(output_folder, exist_ok=True)
+    jobs = [(image_path, output_path_for(output_folder, image_path, output_format=output_format))
+            for image_path in list_images(input_folder)]
+    outputs = dict(jobs)
+
+    # Skip outputs that are already up to date with their input and these settings
+    manifest = RenderManifest(output_folder, content_hash=content_hash)
+    digest_params = dict(params, preset=preset) if preset else dict(params)
+    if memory_budget:
+        # Budgeted renders keep the decoded mode, so e.g. PNGs of opaque images are written as
+        # RGB rather than RGBA; outputs of the other mode are not up to date
+        digest_params["keep_mode"] = True
+    digest = params_hash(digest_params)
+    if not force:
+        jobs = manifest.pending(jobs, digest)
+    copies = []
+    if dedupe:
+        jobs, copies = dedup.plan(jobs, digest)
+
+    def record_progress(done, total, result):
+        if result.success:
+            manifest.record(result.image_path, result.output_path, digest)
+        if progress:
+            progress(done, total, result)
+
+    # With a memory budget, images stay in their decoded mode and the calendar is drawn and
+    # blended in strips within it; the queues still hold up to queue_size images per stage.
+    # JPEG outputs are always rendered that way.
+    if memory_budget:
+        load, render = load_image_native, partial(draw_calendar_strips, budget_bytes=memory_budget, **params)
+    else:
+        render = partial(draw_calendar_strips, **params)
+
+        def load(image_path):
+            return load_image_for_output(image_path, outputs[image_path])
+
+    try:
+        results = run_pipeline(jobs, render, load, partial(save_image, preset=preset),
+                               readers=readers, renderers=renderers, writers=writers, queue_size=queue_size,
+                               progress=record_progress)
+        created = dedup.materialize(copies, {result.output_path for result in results if result.success})
+        for image_path, output_path in created:
+            manifest.record(image_path, output_path, digest)
+        if dedup_stats is not None:
+            dedup_stats.update(dedup.report(copies, created))
+        return results
+    finally:
+        manifest.save()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Add calendars to a folder of images without the GUI.")
+    parser.add_argument("input_folder")
+    parser.add_argument("output_folder")
+    parser.add_argument("--params", required=True,
+                        help="JSON file with add_calendar settings (font_name, colors, month, year, ...)")
+    parser.add_argument("--readers", type=int, default=2)
+    parser.add_argument("--renderers", type=int, default=1)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--queue-size", type=int, default=4)
+    parser.add_argument("--force", action="store_true", help="re-render outputs that are already up to date")
+    parser.add_argument("--content-hash", action="store_true",
+                        help="detect changed inputs by content hash instead of mtime and size")
+    parser.add_argument("--memory-budget", type=float, metavar="MB",
+                        help="draw and blend the calendar in strips within this much working memory "
+                             "(beyond the decoded image) instead of expanding whole images to RGBA, "
+                             "for very large images")
+    parser.add_argument("--format", choices=["png", "jpg", "webp"], help="output format (default: same as input)")
+    parser.add_argument("--preset", choices=list(ENCODER_PRESETS),
+                        help="encoder settings: fast, balanced or small (default: Pillow's defaults)")
+    parser.add_argument("--dedupe", action="store_true",
+                        help="render byte-identical inputs once and hardlink (or copy) the other outputs")
+    parser.add_argument("--profile", metavar="REPORT_JSON",
+                        help="time each stage and write a summary (p50/p95, images/sec, peak RSS)")
+    args = parser.parse_args()
+
+    with open(args.params) as f:
+        params = json.load(f)
+    if args.profile:
+        profiling.enable()
+
+    dedup_stats = {}
+
+    def report_progress(done, total, result):
+        status = "ok" if result.success else f"failed: {result.error}"
+        print(f"[{done}/{total}] {os.path.basename(result.image_path)} {status}")
+
+    results = process_folder(args.input_folder, args.output_folder, params, readers=args.readers,
+                             renderers=args.renderers, writers=args.writers, queue_size=args.queue_size,
+                             progress=report_progress, force=args.force, content_hash=args.content_hash,
+                             memory_budget=int(args.memory_budget * 1024 * 1024) if args.memory_budget else None,
+                             preset=args.preset, output_format=args.format, dedupe=args.dedupe,
+                             dedup_stats=dedup_stats)
+    print(f"Rendered {sum(result.success for result in results)} images, {len(results)} needed rendering"
+          + (dedup.describe(dedup_stats) if dedup_stats else ""))
+    if args.profile:
+        profiling.write_report(args.profile)
+    return 0 if all(result.success for result in results) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
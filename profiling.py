@@ -0,0 +1,154 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Profiling is off unless enable() is called or TAPEZIEREN_PROFILE names a report file.
+# While off, stage() returns a shared no-op context manager and count() returns immediately.
+REPORT_PATH = os.environ.get("TAPEZIEREN_PROFILE")
+
+_enabled = bool(REPORT_PATH)
+_lock = threading.Lock()
+_timings = defaultdict(list)
+_counters = defaultdict(int)
+_started = time.perf_counter() if _enabled else None
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        with _lock:
+            _timings[self.name].append(elapsed)
+        return False
+
+
+def enable():
+    global _enabled, _started
+    _enabled = True
+    if _started is None:
+        _started = time.perf_counter()
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def stage(name):
+    # with stage("decode"): ... records the elapsed time of the block under "decode"
+    if not _enabled:
+        return _NULL_STAGE
+    return _Stage(name)
+
+
+def count(name, amount=1):
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] += amount
+
+
+def reset():
+    global _started
+    with _lock:
+        _timings.clear()
+        _counters.clear()
+    _started = time.perf_counter() if _enabled else None
+
+
+def drain():
+    # Returns and clears the samples collected so far; batch workers send these back
+    # to the parent process, which folds them in with merge()
+    with _lock:
+        samples = {"timings": dict(_timings), "counters": dict(_counters)}
+        _timings.clear()
+        _counters.clear()
+    return samples
+
+
+def merge(samples):
+    if not samples:
+        return
+    with _lock:
+        for name, values in samples.get("timings", {}).items():
+            _timings[name].extend(values)
+        for name, amount in samples.get("counters", {}).items():
+            _counters[name] += amount
+
+
+def _percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, max(0, round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def peak_rss_bytes():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    peak = max(peak, children)
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def report(images=None):
+    with _lock:
+        timings = {name: sorted(values) for name, values in _timings.items()}
+        counters = dict(_counters)
+    elapsed = time.perf_counter() - _started if _started is not None else None
+    if images is None:
+        images = counters.get("images", 0)
+
+    stages = {}
+    for name, values in timings.items():
+        stages[name] = {
+            "count": len(values),
+            "total_s": sum(values),
+            "p50_s": _percentile(values, 0.50),
+            "p95_s": _percentile(values, 0.95),
+            "max_s": values[-1],
+        }
+    return {
+        "elapsed_s": elapsed,
+        "images": images,
+        "images_per_s": images / elapsed if elapsed and images else None,
+        "peak_rss_bytes": peak_rss_bytes(),
+        "stages": stages,
+        "counters": counters,
+    }
+
+
+def write_report(path, images=None):
+    with open(path, "w") as f:
+        json.dump(report(images), f, indent=1)
@@ -0,0 +1,779 @@
+import calendar
+import functools
+import os
+import threading
+from collections import OrderedDict, defaultdict, namedtuple
+from datetime import datetime
+
+from PIL import Image, ImageDraw, ImageFont
+
+import dedup
+import fontcatalog
+import profiling
+from batch import BatchResult, output_path_for, save_options
+from textcache import DEFAULT_INK, draw_label, get_label, label_bounds, load_font
+
+# Rendering for the calendar (Tapezieren.py), text calendar (wup.py) and sticker (Tape.py)
+# tools, their batch runners and worker processes. Nothing here needs tkinter or matplotlib,
+# so workers and command-line tools start without loading either; NumPy is only imported
+# by the sticker stack engine.
+
+# Set Sunday as the first day of the week
+calendar.setfirstweekday(6)
+
+_font_index = None
+_family_index = None
+
+def _style_key(bold, italic):
+    return ('bold' if bold else 'normal'), ('italic' if italic else 'normal')
+
+# Weight words in style names, more specific ones first: (word, bold, rank). A lower rank is
+# a closer match, so a Regular or Book face wins over Light or Black, and Bold over SemiBold.
+_WEIGHT_WORDS = [
+    ("extralight", False, 3), ("ultralight", False, 3), ("hairline", False, 3), ("thin", False, 3),
+    ("semilight", False, 2), ("demilight", False, 2), ("light", False, 2),
+    ("semibold", True, 1), ("demibold", True, 1), ("extrabold", True, 1), ("ultrabold", True, 1),
+    ("bold", True, 0), ("black", True, 2), ("heavy", True, 2),
+    ("medium", False, 1), ("regular", False, 0), ("book", False, 0), ("normal", False, 0),
+    ("roman", False, 0), ("plain", False, 0),
+]
+
+def _face_rank(style_name):
+    # (weight, style, rank) for a font's style name, e.g. "SemiBold Italic" ->
+    # ('bold', 'italic', (1, 0)); the second rank counts leftover words such as "Condensed"
+    name = "".join(style_name.lower().split()).replace("-", "").replace("_", "")
+    italic = 'italic' in name or 'oblique' in name
+    name = name.replace("italic", "").replace("oblique", "")
+    bold, rank = False, 0
+    for word, word_bold, word_rank in _WEIGHT_WORDS:
+        if word in name:
+            bold, rank = word_bold, word_rank
+            name = name.replace(word, "", 1)
+            break
+    return ('bold' if bold else 'normal'), ('italic' if italic else 'normal'), (rank, 1 if name else 0)
+
+def reset_font_index():
+    # Forget the index so the next lookup rebuilds it, as on a new launch
+    global _font_index, _family_index
+    _font_index = None
+    _family_index = None
+    load_font.cache_clear()
+
+def build_font_index(catalog=None):
+    # Map (family, weight, style) to a path, from the on-disk font catalog the first time
+    # this is called in a process; pass a catalog to rebuild from it
+    global _font_index, _family_index
+    if _font_index is not None and catalog is None:
+        return _font_index
+    if catalog is None:
+        catalog = fontcatalog.get_catalog()
+    # Of several faces with the same family, weight and style, the best ranked one is used;
+    # path order only breaks ties
+    ranked = {}
+    family_index = {}
+    for font_path, entry in fontcatalog.fonts(catalog):
+        family = entry["family"]
+        weight, style, rank = _face_rank(entry["style"])
+        key = (family, weight, style)
+        if key not in ranked or rank < ranked[key][0]:
+            ranked[key] = (rank, font_path)
+        family_index.setdefault(family, font_path)
+    font_index = {key: font_path for key, (_, font_path) in ranked.items()}
+    # Prefer the regular face when falling back to "any variant" of a family
+    for (family, weight, style), font_path in font_index.items():
+        if weight == 'normal' and style == 'normal':
+            family_index[family] = font_path
+    _font_index, _family_index = font_index, family_index
+    return _font_index
+
+def get_available_fonts():
+    return sorted({family for family, _, _ in build_font_index()})
+
+def find_font_path(font_name, bold=False, italic=False):
+    font_index = build_font_index()
+    font_path = font_index.get((font_name, *_style_key(bold, italic)))
+    if font_path is None:
+        # If exact match not found, try to find any variant of the font
+        font_path = _family_index.get(font_name)
+    return font_path
+
+def get_font(font_name, font_size, bold=False, italic=False):
+    with profiling.stage("font"):
+        try:
+            font_path = find_font_path(font_name, bold, italic)
+            if font_path is not None:
+                return load_font(font_path, font_size)
+            return ImageFont.load_default()
+        except Exception:
+            return ImageFont.load_default()
+
+# Rendered calendar overlays are reused across images with the same size and settings
+OVERLAY_CACHE_SIZE = 64
+OVERLAY_CACHE_BYTES = 256 * 1024 * 1024
+
+_overlay_cache = OrderedDict()
+_overlay_cache_bytes = 0
+_overlay_cache_lock = threading.Lock()
+
+def render_calendar_overlay(size, font_name, font_color, box_color, weekday_color,
+                            holiday_color, day_name_color, transparency, curvature, table_size, x_offset,
+                            y_offset, selected_month, selected_year, bold=False, italic=False, hollow=False,
+                            stroke_width=2):
+    # Returns (patch, origin): only the calendar's bounding box (clipped to the image) is
+    # rendered, to be composited at origin instead of blending a full-frame overlay
+    layout = calendar_layout(size, font_name, font_color, box_color, weekday_color, holiday_color,
+                             day_name_color, transparency, curvature, table_size, x_offset, y_offset,
+                             selected_month, selected_year, bold, italic, hollow, stroke_width)
+    return draw_overlay_rows(layout), layout[0][:2]
+
+def calendar_layout(size, font_name, font_color, box_color, weekday_color,
+                    holiday_color, day_name_color, transparency, curvature, table_size, x_offset,
+                    y_offset, selected_month, selected_year, bold=False, italic=False, hollow=False,
+                    stroke_width=2):
+    # Where everything goes, without drawing it: (bounds, box, radius, box color, labels, hollow),
+    # with bounds the (left, top, right, bottom) of the overlay in image coordinates
+    img_width, img_height = size
+    base_size = min(img_width, img_height)
+    cell_width = int(base_size / 7 * table_size)
+    cell_height = int(base_size / 8 * table_size)
+    margin = int(0.02 * base_size * table_size)
+
+    font_size = int(base_size * table_size / 20)  # Adjust font size based on table size
+    regular_font = get_font(font_name, font_size, bold, italic)
+    day_name_font = get_font(font_name, int(font_size * 0.9), bold, italic)
+    month_font = get_font(font_name, int(font_size * 1.1), bold, italic)
+
+    cal = calendar.monthcalendar(selected_year, selected_month)
+    month_name = calendar.month_name[selected_month]
+
+    x_start = int(x_offset * (img_width - cell_width * 7))
+    y_start = int(y_offset * (img_height - (cell_height * (len(cal) + 1) + 2 * margin)))
+
+    # Lay out every label first (x, y, label, color) so the patch can be sized to fit them
+    labels = []
+
+    title_text = f"{month_name} {selected_year}"
+    stroke = stroke_width if hollow else 0
+    title_label = get_label(month_font, title_text, stroke)
+    title_bbox = title_label[0]
+    title_width = title_bbox[2] - title_bbox[0]
+    title_height = title_bbox[3] - title_bbox[1]
+    title_x = x_start + (cell_width * 7 - title_width) // 2
+    title_y = y_start + margin
+    labels.append((title_x, title_y, title_label, font_color))
+
+    # Day names
+    days = ["SUN", "MON", "TUE", "WED", "THU", "FRI", "SAT"]
+    for i, day in enumerate(days):
+        x = x_start + i * cell_width + margin
+        y = y_start + title_height + 2 * margin
+        day_label = get_label(day_name_font, day, stroke)
+        day_bbox = day_label[0]
+        day_width = day_bbox[2] - day_bbox[0]
+        day_height = day_bbox[3] - day_bbox[1]
+        day_x = x + (cell_width - day_width) // 2
+        day_y = y + (cell_height - day_height) // 2
+        labels.append((day_x, day_y, day_label, day_name_color))
+
+    # Dates
+    for week_index, week in enumerate(cal):
+        for day_index, day in enumerate(week):
+            if day != 0:
+                x = x_start + day_index * cell_width + margin
+                y = y_start + (week_index + 1) * cell_height + title_height + 2 * margin
+
+                date_text = str(day)
+                date_label = get_label(regular_font, date_text, stroke)
+                date_bbox = date_label[0]
+                date_width = date_bbox[2] - date_bbox[0]
+                date_height = date_bbox[3] - date_bbox[1]
+                date_x = x + (cell_width - date_width) // 2
+                date_y = y + (cell_height - date_height) // 2
+
+                # Choose color based on whether it's a holiday (weekend)
+                color = holiday_color if day_index in [5, 6] else weekday_color
+                labels.append((date_x, date_y, date_label, color))
+
+    calendar_width = cell_width * 7 + 2 * margin
+    calendar_height = cell_height * (len(cal) + 1) + 2 * margin + title_height
+    box = (x_start, y_start, x_start + calendar_width, y_start + calendar_height)
+
+    # Bounding box of the background box and every label, clipped to the image
+    left, top, right, bottom = box[0], box[1], box[2] + 1, box[3] + 1
+    for x, y, label, _ in labels:
+        label_left, label_top, label_right, label_bottom = label_bounds((x, y), label)
+        left, top = min(left, label_left), min(top, label_top)
+        right, bottom = max(right, label_right), max(bottom, label_bottom)
+    left, top = max(0, left), max(0, top)
+    right, bottom = min(img_width, right), min(img_height, bottom)
+
+    bounds = (left, top, max(left, right), max(top, bottom))
+    box_color_with_alpha = (*box_color[:3], int(255 * transparency))
+    return bounds, box, int(curvature * base_size / 100), box_color_with_alpha, labels, hollow
+
+def draw_overlay_rows(layout, first=0, last=None):
+    # Draws rows first to last (exclusive, default: all) of the overlay laid out by
+    # calendar_layout; parts of the box and labels outside those rows are clipped
+    (left, top, right, bottom), box, radius, box_color_with_alpha, labels, hollow = layout
+    last = bottom - top if last is None else last
+    top += first
+    patch = Image.new('RGBA', (right - left, last - first), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(patch)
+
+    # Draw background box
+    draw.rounded_rectangle(
+        [(box[0] - left, box[1] - top), (box[2] - left, box[3] - top)],
+        radius=radius, fill=box_color_with_alpha
+    )
+
+    # Draw month name, day names and dates
+    for x, y, label, color in labels:
+        _, label_top, _, label_bottom = label_bounds((x, y), label)
+        if label_bottom <= top or label_top >= top + patch.height:
+            continue
+        if hollow:
+            draw_label(patch, (x - left, y - top), label, DEFAULT_INK, stroke_color=color)
+        else:
+            draw_label(patch, (x - left, y - top), label, color)
+
+    return patch
+
+@functools.lru_cache(maxsize=1)
+def _overlay_signature():
+    import inspect
+    return inspect.signature(render_calendar_overlay)
+
+def get_calendar_overlay(size, *args, **kwargs):
+    # Cached render_calendar_overlay; returns (patch, origin)
+    global _overlay_cache_bytes
+    bound = _overlay_signature().bind(size, *args, **kwargs)
+    bound.apply_defaults()
+    key = _cache_key(tuple(bound.arguments.values()))
+    with _overlay_cache_lock:
+        overlay = _overlay_cache.get(key)
+        if overlay is not None:
+            _overlay_cache.move_to_end(key)
+            profiling.count("overlay_cache_hits")
+            return overlay
+
+    profiling.count("overlay_cache_misses")
+    with profiling.stage("draw"):
+        overlay = render_calendar_overlay(size, *args, **kwargs)
+    overlay_bytes = _overlay_bytes(overlay)
+    if overlay_bytes > OVERLAY_CACHE_BYTES:
+        return overlay
+
+    with _overlay_cache_lock:
+        if key not in _overlay_cache:
+            _overlay_cache[key] = overlay
+            _overlay_cache_bytes += overlay_bytes
+        while len(_overlay_cache) > OVERLAY_CACHE_SIZE or _overlay_cache_bytes > OVERLAY_CACHE_BYTES:
+            _, evicted = _overlay_cache.popitem(last=False)
+            _overlay_cache_bytes -= _overlay_bytes(evicted)
+    return overlay
+
+def _overlay_bytes(overlay):
+    patch, _ = overlay
+    return patch.width * patch.height * 4
+
+def clear_overlay_cache():
+    global _overlay_cache_bytes
+    with _overlay_cache_lock:
+        _overlay_cache.clear()
+        _overlay_cache_bytes = 0
+
+def _cache_key(value):
+    # Sizes and colors may arrive as lists (e.g. from JSON), cache keys must be hashable
+    if isinstance(value, (list, tuple)):
+        return tuple(_cache_key(v) for v in value)
+    return value
+
+def draw_calendar(img, *args, **kwargs):
+    # Blends the calendar into the RGBA image in place, touching only the calendar's region
+    patch, origin = get_calendar_overlay(img.size, *args, **kwargs)
+    with profiling.stage("composite"):
+        if patch.width and patch.height:
+            img.alpha_composite(patch, dest=origin)
+    return img
+
+# Strip size for blending into images kept in their own mode when no budget is given
+MEMORY_BUDGET_BYTES = 64 * 1024 * 1024
+
+def draw_calendar_strips(img, *args, budget_bytes=None, **kwargs):
+    # Like draw_calendar, but for images kept in their own mode (e.g. RGB): the calendar
+    # region is expanded to RGBA and blended in horizontal strips, so no full-size RGBA copy
+    # of the image is ever made. With budget_bytes, everything the render allocates beyond
+    # the decoded image stays within it: the overlay is then drawn strip by strip too, and
+    # is not cached.
+    if budget_bytes is None:
+        if img.mode == "RGBA":
+            return draw_calendar(img, *args, **kwargs)
+        patch, (left, top) = get_calendar_overlay(img.size, *args, **kwargs)
+        overlay_rows = lambda first, last: patch.crop((0, first, patch.width, last))
+        width, height = patch.size
+        budget_bytes = MEMORY_BUDGET_BYTES
+    else:
+        with profiling.stage("draw"):
+            layout = calendar_layout(img.size, *args, **kwargs)
+        overlay_rows = functools.partial(draw_overlay_rows, layout)
+        left, top, right, bottom = layout[0]
+        width, height = right - left, bottom - top
+    # Per row: the RGBA strip, its slice of the overlay and the strip converted back
+    rows = max(1, budget_bytes // max(1, width * 4 * 3))
+    with profiling.stage("composite"):
+        for y in range(0, height, rows):
+            bottom = min(y + rows, height)
+            box = (left, top + y, left + width, top + bottom)
+            strip = img.crop(box).convert("RGBA")
+            strip.alpha_composite(overlay_rows(y, bottom))
+            img.paste(strip.convert(img.mode), box)
+    return img
+
+def load_image(image_path, profiles=()):
+    with profiling.stage("decode"):
+        with Image.open(image_path) as img:
+            _draft_for_profiles(img, profiles)
+            return img.convert("RGBA")
+
+def load_image_native(image_path, profiles=()):
+    # Decodes without expanding to RGBA; only images that cannot be blended into directly
+    # (palette, grayscale, CMYK, ...) are converted
+    with profiling.stage("decode"):
+        with Image.open(image_path) as img:
+            _draft_for_profiles(img, profiles)
+            if img.mode in ("RGB", "RGBA"):
+                # Loaded pixels outlive the file handle closed on leaving the block
+                img.load()
+                return img
+            has_alpha = "A" in img.getbands() or "transparency" in img.info
+            return img.convert("RGBA" if has_alpha else "RGB")
+
+def load_image_for_output(image_path, output_path):
+    # Images written out as JPEG stay RGB end to end: draw_calendar_strips blends only the
+    # calendar region instead of a full RGBA round trip
+    if _is_jpeg(output_path):
+        return load_image_native(image_path)
+    return load_image(image_path)
+
+def _is_jpeg(path):
+    return path.lower().endswith((".jpg", ".jpeg"))
+
+def save_image(img, output_path, preset=None):
+    # preset names one of ENCODER_PRESETS; EXIF and ICC data from the source are kept
+    with profiling.stage("encode"):
+        options = save_options(output_path, preset, img.info)
+        if _is_jpeg(output_path) and img.mode != "RGB":
+            img = img.convert("RGB")
+        dedup.unlink_shared(output_path)
+        img.save(output_path, **options)
+
+def add_calendar(image_path, output_path, *args, **kwargs):
+    # render_calendar that prints failures and returns False instead of raising
+    try:
+        return render_calendar(image_path, output_path, *args, **kwargs)
+    except Exception as e:
+        print(f"Failed to process {image_path}: {e}")
+        return False
+
+def render_calendar(image_path, output_path, font_name, font_color, box_color, weekday_color,
+                    holiday_color, day_name_color, transparency, curvature, table_size, x_offset, y_offset,
+                    selected_month, selected_year, bold=False, italic=False, hollow=False, memory_budget=None,
+                    preset=None):
+    # memory_budget (bytes) keeps the image in its decoded mode and draws and blends the
+    # calendar in strips, for very large images where full-size RGBA copies would not fit in
+    # memory; it caps everything the render allocates beyond the decoded image. Outputs then
+    # keep the decoded mode too (RGB PNGs for opaque images, where RGBA is written otherwise).
+    # preset picks the output encoder settings, see ENCODER_PRESETS. Failures raise, so
+    # batch runs can report why an image failed.
+    args = (font_name, font_color, box_color, weekday_color, holiday_color, day_name_color,
+            transparency, curvature, table_size, x_offset, y_offset, selected_month, selected_year,
+            bold, italic, hollow)
+    if memory_budget:
+        img = load_image_native(image_path)
+    else:
+        img = load_image_for_output(image_path, output_path)
+    img = draw_calendar_strips(img, *args, budget_bytes=memory_budget)
+    save_image(img, output_path, preset)
+    return True
+
+def month_range(start_month, start_year, count):
+    # (year, month) for count consecutive months, rolling over into the following years
+    first = start_year * 12 + start_month - 1
+    return [(index // 12, index % 12 + 1) for index in range(first, first + count)]
+
+def month_output_path(output_folder, image_path, year, month, output_format=None):
+    return output_path_for(output_folder, image_path, prefix=f"calendar_{year:04d}-{month:02d}_",
+                           output_format=output_format)
+
+def add_calendar_months(image_path, output_folder, selected_month, selected_year, month_count=12, preset=None,
+                        output_format=None, **params):
+    # Decodes the image once and writes calendar_<yyyy>-<mm>_<name> for month_count months;
+    # failures raise, like render_calendars
+    renders = [(month_output_path(output_folder, image_path, year, month, output_format),
+                dict(params, selected_month=month, selected_year=year), preset)
+               for year, month in month_range(selected_month, selected_year, month_count)]
+    return render_calendars(image_path, renders)
+
+def add_calendars(image_path, renders):
+    # render_calendars that prints failures and returns False instead of raising
+    try:
+        return render_calendars(image_path, renders)
+    except Exception as e:
+        print(f"Failed to process {image_path}: {e}")
+        return False
+
+def render_calendars(image_path, renders):
+    # Writes one output per (output_path, params, preset) in renders from a single decode.
+    # A render with a DisplayProfile as its fourth item is written at the profile's size,
+    # see profile_images. Only the calendar region differs between outputs of one size: it
+    # is saved before compositing and pasted back afterwards, so the background never has
+    # to be decoded again.
+    groups = OrderedDict()
+    for output_path, params, preset, *profile in renders:
+        groups.setdefault(profile[0] if profile else None, []).append((output_path, params, preset))
+    profiles = [profile for profile in groups if profile is not None]
+    # Without a full-size output, JPEG sources only need decoding at the largest profile's scale
+    draft = [] if None in groups else profiles
+    if all(_is_jpeg(output_path) for output_path, _, _, *_ in renders):
+        img = load_image_native(image_path, draft)
+    else:
+        img = load_image(image_path, draft)
+    sized = [(None, img)] if None in groups else []
+    for profile, profile_img in sized + list(profile_images(img, profiles)):
+        for output_path, params, preset in groups[profile]:
+            patch, (left, top) = get_calendar_overlay(profile_img.size, **params)
+            box = (left, top, left + patch.width, top + patch.height)
+            background = profile_img.crop(box) if patch.width and patch.height else None
+            draw_calendar_strips(profile_img, **params)
+            save_image(profile_img, output_path, preset)
+            if background is not None:
+                profile_img.paste(background, box)
+    return True
+
+# A target display: fit="crop" fills width x height and crops the overflow around the
+# center, fit="fit" scales the whole image to fit inside it
+DisplayProfile = namedtuple("DisplayProfile", ["name", "width", "height", "fit"], defaults=("crop",))
+
+DISPLAY_PROFILES = OrderedDict((profile.name, profile) for profile in [
+    DisplayProfile("4k", 3840, 2160),
+    DisplayProfile("1440p", 2560, 1440),
+    DisplayProfile("1080p", 1920, 1080),
+    DisplayProfile("phone-1440", 1440, 3200),
+    DisplayProfile("phone-1179", 1179, 2556),
+    DisplayProfile("phone-1080", 1080, 2400),
+])
+PROFILE_FITS = ("crop", "fit")
+
+def get_profile(value):
+    # A DisplayProfile from a DISPLAY_PROFILES name or a {"name", "width", "height", "fit"} dict
+    if isinstance(value, DisplayProfile):
+        return value
+    if isinstance(value, str):
+        if value not in DISPLAY_PROFILES:
+            raise ValueError(f"unknown display profile {value}, expected one of {', '.join(DISPLAY_PROFILES)}")
+        return DISPLAY_PROFILES[value]
+    profile = DisplayProfile(value["name"], int(value["width"]), int(value["height"]), value.get("fit", "crop"))
+    if profile.width < 1 or profile.height < 1:
+        raise ValueError(f"display profile {profile.name} needs a positive width and height")
+    if profile.fit not in PROFILE_FITS:
+        raise ValueError(f"display profile {profile.name}: fit must be one of {', '.join(PROFILE_FITS)}")
+    return profile
+
+def profile_scaled_size(size, profile):
+    # The size the whole image is scaled to before a crop profile is cropped
+    width, height = size
+    if profile.fit == "crop":
+        scale = max(profile.width / width, profile.height / height)
+        return max(profile.width, round(width * scale)), max(profile.height, round(height * scale))
+    scale = min(profile.width / width, profile.height / height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+def _draft_for_profiles(img, profiles):
+    # Lets JPEG decode at a reduced DCT scale (1/2, 1/4, 1/8) that still covers every profile
+    if profiles:
+        sizes = [profile_scaled_size(img.size, profile) for profile in profiles]
+        img.draft(img.mode, (max(width for width, _ in sizes), max(height for _, height in sizes)))
+
+def profile_images(img, profiles):
+    # Yields (profile, image) for each profile, largest first. Each size is downscaled from
+    # the smallest image made so far that still covers it (4K -> 1440p -> 1080p ...) instead
+    # of from the full-size source; upscaled images are never used as a source, and img
+    # itself is yielded when it already has the size. An image may be yielded again as the
+    # source of the next sizes, so callers must leave it as they found it.
+    levels = [img]
+    for profile in sorted(profiles, key=lambda profile: profile_scaled_size(img.size, profile), reverse=True):
+        width, height = profile_scaled_size(img.size, profile)
+        covering = [level for level in levels if level.width >= width and level.height >= height
+                    and level.width * level.height <= img.width * img.height]
+        source = min(covering, key=lambda level: level.width * level.height, default=img)
+        if source.size != (width, height):
+            with profiling.stage("resize"):
+                source = source.resize((width, height), Image.Resampling.LANCZOS)
+            levels.append(source)
+        if profile.fit == "crop" and source.size != (profile.width, profile.height):
+            left = (width - profile.width) // 2
+            top = (height - profile.height) // 2
+            yield profile, source.crop((left, top, left + profile.width, top + profile.height))
+        else:
+            yield profile, source
+
+def profile_output_path(output_folder, image_path, profile, output_format=None):
+    return output_path_for(output_folder, image_path, prefix=f"calendar_{profile.name}_",
+                           output_format=output_format)
+
+def add_calendar_profiles(image_path, output_folder, profiles, preset=None, output_format=None, **params):
+    # Decodes the image once and writes calendar_<profile>_<name> for each display profile,
+    # with the calendar drawn at that size rather than scaled down with the image
+    profiles = [get_profile(profile) for profile in profiles]
+    renders = [(profile_output_path(output_folder, image_path, profile, output_format), params, preset, profile)
+               for profile in profiles]
+    return render_calendars(image_path, renders)
+
+# Text calendar (wup.py)
+
+def generate_calendar_text(year=None, month=None):
+    # The current month unless year and month are given
+    if year is None or month is None:
+        now = datetime.now()
+        year, month = now.year, now.month
+    cal = calendar.monthcalendar(year, month)
+    month_name = calendar.month_name[month]
+    cal_text = f"{month_name} {year}\n"
+    cal_text += "Su Mo Tu We Th Fr Sa\n"
+    for week in cal:
+        cal_text += " ".join(f"{day:2}" if day != 0 else "  " for day in week) + "\n"
+    return cal_text
+
+def draw_rounded_rectangle(draw, xy, fill, radius):
+    x1, y1, x2, y2 = xy
+    draw.rectangle([x1 + radius, y1, x2 - radius, y2], fill=fill)
+    draw.rectangle([x1, y1 + radius, x2, y2 - radius], fill=fill)
+    draw.pieslice([x1, y1, x1 + radius * 2, y1 + radius * 2], 180, 270, fill=fill)
+    draw.pieslice([x2 - radius * 2, y1, x2, y1 + radius * 2], 270, 360, fill=fill)
+    draw.pieslice([x1, y2 - radius * 2, x1 + radius * 2, y2], 90, 180, fill=fill)
+    draw.pieslice([x2 - radius * 2, y2 - radius * 2, x2, y2], 0, 90, fill=fill)
+
+def add_text_calendar(image_path, output_path, font_path, font_size, font_color, box_color, corner_radius,
+                      year=None, month=None):
+    try:
+        with Image.open(image_path).convert("RGBA") as img:
+            draw = ImageDraw.Draw(img)
+
+            base_resolution = 1000
+            relative_font_size = int(font_size * (max(img.size) / base_resolution))
+
+            try:
+                font = load_font(font_path, relative_font_size)
+            except IOError:
+                print(f"Failed to load font {font_path}. Using default font.")
+                font = ImageFont.load_default()
+
+            cal_text = generate_calendar_text(year, month)
+
+            calendar_lines = cal_text.split('\n')
+            line_labels = [get_label(font, line) for line in calendar_lines]
+            line_height = get_label(font, "A")[0][3]
+            total_height = line_height * len(calendar_lines)
+            max_line_width = max(label[0][2] for label in line_labels)
+
+            margin = int(0.05 * min(img.size))
+            text_x = img.size[0] - max_line_width - margin
+            text_y = (img.size[1] - total_height) // 2
+
+            box_padding = int(0.02 * min(img.size))
+            box_x1 = text_x - box_padding
+            box_y1 = text_y - box_padding
+            box_x2 = img.size[0] - margin + box_padding
+            box_y2 = text_y + total_height + box_padding
+
+            draw_rounded_rectangle(draw, (box_x1, box_y1, box_x2, box_y2), box_color, corner_radius)
+
+            current_y = text_y
+            for label in line_labels:
+                draw_label(img, (text_x, current_y), label, font_color)
+                current_y += line_height
+
+            if output_path.lower().endswith((".jpg", ".jpeg")):
+                img = img.convert("RGB")
+
+            dedup.unlink_shared(output_path)
+            img.save(output_path)
+            print(f"Saved output to {output_path}")
+            return True
+    except Exception as e:
+        print(f"Failed to process {image_path}: {e}")
+        return False
+
+# Stickers (Tape.py)
+
+def scale_sticker(sticker, wallpaper_width, sticker_scale):
+    # Calculate sticker size relative to wallpaper dimensions
+    with profiling.stage("resize"):
+        sticker_width = int(wallpaper_width * sticker_scale)
+        sticker_height = int(sticker.size[1] * (sticker_width / sticker.size[0]))
+        return sticker.resize((sticker_width, sticker_height), Image.LANCZOS)
+
+def place_sticker(wallpaper, sticker, x_pos, y_pos):
+    with profiling.stage("composite"):
+        # Create a new image with the same size as the wallpaper
+        combined = Image.new("RGBA", wallpaper.size)
+        combined.paste(wallpaper, (0, 0))
+
+        # Position the sticker based on slider values
+        pos_x = int(x_pos * (wallpaper.size[0] - sticker.size[0]))
+        pos_y = int(y_pos * (wallpaper.size[1] - sticker.size[1]))
+        combined.paste(sticker, (pos_x, pos_y), sticker)
+    return combined
+
+def compose_sticker(wallpaper, sticker, sticker_scale, x_pos, y_pos):
+    sticker = scale_sticker(sticker, wallpaper.size[0], sticker_scale)
+    return place_sticker(wallpaper, sticker, x_pos, y_pos)
+
+# Decoded stickers and their resized variants, per process. A batch resizes the sticker
+# once per distinct wallpaper width instead of once per wallpaper.
+@functools.lru_cache(maxsize=4)
+def _load_sticker(sticker_path, mtime_ns):
+    with profiling.stage("decode"):
+        with Image.open(sticker_path) as sticker:
+            return sticker.convert("RGBA")
+
+@functools.lru_cache(maxsize=32)
+def _scaled_sticker(sticker_path, mtime_ns, wallpaper_width, sticker_scale):
+    return scale_sticker(_load_sticker(sticker_path, mtime_ns), wallpaper_width, sticker_scale)
+
+def add_sticker(wallpaper_path, output_path, sticker_path, sticker_scale, x_pos, y_pos):
+    with profiling.stage("decode"):
+        wallpaper = Image.open(wallpaper_path).convert("RGBA")
+
+    mtime_ns = os.stat(sticker_path).st_mtime_ns
+    sticker = _scaled_sticker(sticker_path, mtime_ns, wallpaper.size[0], sticker_scale)
+    combined = place_sticker(wallpaper, sticker, x_pos, y_pos)
+
+    with profiling.stage("encode"):
+        # Convert to RGB if saving as JPEG
+        if output_path.lower().endswith((".jpg", ".jpeg")):
+            combined = combined.convert("RGB")
+
+        dedup.unlink_shared(output_path)
+        combined.save(output_path)
+    return True
+
+def has_numpy():
+    # Whether the numpy engine can be used, without importing NumPy
+    import importlib.util
+    return importlib.util.find_spec("numpy") is not None
+
+# The numpy engine blends up to STACK_SIZE same-sized wallpapers in one array operation,
+# holding at most STACK_BYTES of decoded pixels at a time
+STACK_SIZE = 16
+STACK_BYTES = 256 * 1024 * 1024
+
+@functools.lru_cache(maxsize=32)
+def _sticker_arrays(sticker_path, mtime_ns, wallpaper_width, sticker_scale):
+    # The scaled sticker's channels times its alpha (S * A) and inverse alpha (255 - A), the
+    # products on a 0..255*255 scale, so blending is one multiply-add per channel.
+    # S * A + D * (255 - A) never exceeds 255 * 255, so everything fits in uint16.
+    import numpy as np
+    sticker = np.asarray(_scaled_sticker(sticker_path, mtime_ns, wallpaper_width, sticker_scale),
+                         dtype=np.uint16)
+    alpha = sticker[..., 3:]
+    return sticker * alpha, 255 - alpha
+
+def blend_sticker_stack(stack, sticker_arrays, x_pos, y_pos):
+    # Blends the sticker into every image of stack, a (count, height, width, channels) uint8
+    # array, touching only the sticker's region. Like place_sticker, which pastes the sticker
+    # with itself as the mask, every channel (alpha too) becomes S * A + D * (255 - A).
+    weighted, inverse_alpha = sticker_arrays
+    sticker_height, sticker_width = weighted.shape[:2]
+    height, width, channels = stack.shape[1:]
+    pos_x = int(x_pos * (width - sticker_width))
+    pos_y = int(y_pos * (height - sticker_height))
+
+    # Clip the sticker to the wallpaper
+    left, top = max(0, -pos_x), max(0, -pos_y)
+    right = min(sticker_width, width - pos_x)
+    bottom = min(sticker_height, height - pos_y)
+    if right <= left or bottom <= top:
+        return stack
+    sticker_slice = (slice(top, bottom), slice(left, right))
+    region = stack[:, pos_y + top:pos_y + bottom, pos_x + left:pos_x + right]
+
+    with profiling.stage("composite"):
+        region[...] = _divide_255(weighted[sticker_slice][..., :channels] + region * inverse_alpha[sticker_slice])
+    return stack
+
+def _divide_255(values):
+    # Rounded values / 255 for uint16 values up to 255 * 255, the same rounding Pillow's paste uses
+    values += 128
+    values += values >> 8
+    values >>= 8
+    return values
+
+def add_sticker_stack(label, jobs, sticker_path, sticker_scale, x_pos, y_pos):
+    # numpy engine: jobs is a list of (wallpaper_path, output_path), normally same-sized
+    # wallpapers. They are decoded into one array, blended together and written out one by
+    # one. Returns a BatchResult per wallpaper, so one bad file only fails itself; label
+    # only names the group. Outputs match add_sticker's: RGBA, except for JPEGs.
+    import numpy as np
+    results = []
+    groups = defaultdict(list)
+    for wallpaper_path, output_path in jobs:
+        try:
+            with profiling.stage("decode"):
+                with Image.open(wallpaper_path) as wallpaper:
+                    wallpaper = wallpaper.convert("RGB" if _is_jpeg(output_path) else "RGBA")
+        except Exception as e:
+            results.append(BatchResult(wallpaper_path, output_path, False, str(e)))
+            continue
+        groups[wallpaper.size, wallpaper.mode].append([wallpaper_path, output_path, wallpaper])
+
+    for ((width, height), mode), group in groups.items():
+        stack = np.empty((len(group), height, width, len(mode)), dtype=np.uint8)
+        for index, item in enumerate(group):
+            stack[index] = np.asarray(item[2])
+            item[2] = None  # the stack holds the pixels now
+        try:
+            mtime_ns = os.stat(sticker_path).st_mtime_ns
+            sticker_arrays = _sticker_arrays(sticker_path, mtime_ns, width, sticker_scale)
+        except Exception as e:
+            results.extend(BatchResult(wallpaper_path, output_path, False, str(e))
+                           for wallpaper_path, output_path, _ in group)
+            continue
+        blend_sticker_stack(stack, sticker_arrays, x_pos, y_pos)
+
+        for index, (wallpaper_path, output_path, _) in enumerate(group):
+            try:
+                with profiling.stage("encode"):
+                    dedup.unlink_shared(output_path)
+                    Image.fromarray(stack[index]).save(output_path)
+                profiling.count("stacked_images")
+                results.append(BatchResult(wallpaper_path, output_path, True, None))
+            except Exception as e:
+                results.append(BatchResult(wallpaper_path, output_path, False, str(e)))
+    return results
+
+def stack_pairs(label, jobs):
+    # run_batch's group for add_sticker_stack jobs
+    return jobs
+
+def stack_jobs(jobs_by_size, max_count=STACK_SIZE, max_bytes=STACK_BYTES):
+    # Splits {size: [(wallpaper_path, output_path), ...]} into groups for add_sticker_stack
+    groups = []
+    for size, jobs in jobs_by_size.items():
+        count = max_count
+        if size is not None:
+            count = max(1, min(max_count, max_bytes // (size[0] * size[1] * 4)))
+        groups += [jobs[start:start + count] for start in range(0, len(jobs), count)]
+    return groups
+
+def bucket_by_size(image_paths):
+    # Group images by dimensions (read from the header only); unreadable files go under None
+    buckets = defaultdict(list)
+    for image_path in image_paths:
+        try:
+            with Image.open(image_path) as img:
+                size = img.size
+        except Exception:
+            size = None
+        buckets[size].append(image_path)
+    return buckets
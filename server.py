@@ -0,0 +1,283 @@
+import argparse
+import hashlib
+import io
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from batch import ENCODER_PRESETS, default_workers, save_options
+from render import draw_calendar_strips, load_image, load_image_native
+
+# Largest accepted upload
+MAX_UPLOAD_BYTES = 64 * 1024 * 1024
+# How long a request waits for a free render slot before getting 503
+QUEUE_TIMEOUT = 30.0
+# Rendered responses kept for repeated identical requests
+RESPONSE_CACHE_SIZE = 32
+RESPONSE_CACHE_BYTES = 128 * 1024 * 1024
+
+CONTENT_TYPES = {"png": "image/png", "jpg": "image/jpeg", "webp": "image/webp"}
+_PIL_FORMATS = {"png": "PNG", "jpg": "JPEG", "webp": "WEBP"}
+
+COLOR_PARAMS = ("font_color", "box_color", "weekday_color", "holiday_color", "day_name_color")
+# Allowed ranges: the GUI's slider ranges, and the years the calendar module supports.
+# Anything larger (e.g. a huge table_size) would only make a worker allocate huge images.
+FLOAT_PARAMS = {"transparency": (0, 1), "curvature": (0, 100), "table_size": (0.1, 2), "x_offset": (0, 1),
+                "y_offset": (0, 1)}
+INT_PARAMS = {"selected_month": (1, 12), "selected_year": (1, 9999)}
+BOOL_PARAMS = ("bold", "italic", "hollow")
+
+# The GUI's defaults; month and year default to the current ones
+DEFAULT_PARAMS = dict(
+    font_name="DejaVu Sans",
+    font_color=(255, 255, 255),
+    box_color=(0, 0, 0),
+    weekday_color=(200, 200, 200),
+    holiday_color=(255, 100, 100),
+    day_name_color=(150, 150, 150),
+    transparency=0.5,
+    curvature=20.0,
+    table_size=1.0,
+    x_offset=0.5,
+    y_offset=0.5,
+    bold=False,
+    italic=False,
+    hollow=False,
+)
+
+
+def parse_params(query):
+    # Calendar settings from a query string: colors as "r,g,b", booleans as 1/0 or true/false.
+    # Returns (params, output_format, preset); raises ValueError for anything malformed.
+    values = {key: items[-1] for key, items in parse_qs(query).items()}
+    now = datetime.now()
+    params = dict(DEFAULT_PARAMS, selected_month=now.month, selected_year=now.year)
+    output_format = values.pop("format", "png").lower().replace("jpeg", "jpg")
+    preset = values.pop("preset", None)
+    if output_format not in CONTENT_TYPES:
+        raise ValueError(f"format must be one of {', '.join(CONTENT_TYPES)}")
+    if preset is not None and preset not in ENCODER_PRESETS:
+        raise ValueError(f"preset must be one of {', '.join(ENCODER_PRESETS)}")
+
+    for key, value in values.items():
+        if key == "font_name":
+            params[key] = value
+        elif key in COLOR_PARAMS:
+            color = tuple(int(part) for part in value.split(","))
+            if len(color) not in (3, 4) or not all(0 <= part <= 255 for part in color):
+                raise ValueError(f"{key} must be r,g,b with values from 0 to 255")
+            params[key] = color
+        elif key in FLOAT_PARAMS or key in INT_PARAMS:
+            low, high = FLOAT_PARAMS.get(key) or INT_PARAMS[key]
+            params[key] = float(value) if key in FLOAT_PARAMS else int(value)
+            # Also false for nan
+            if not low <= params[key] <= high:
+                raise ValueError(f"{key} must be from {low} to {high}")
+        elif key in BOOL_PARAMS:
+            params[key] = value.lower() in ("1", "true", "yes", "on")
+        else:
+            raise ValueError(f"unknown parameter {key}")
+    return params, output_format, preset
+
+
+def render_calendar(data, params, output_format="png", preset=None):
+    # Runs in a pool worker: the worker's font and overlay caches carry over between requests
+    source = io.BytesIO(data)
+    img = load_image_native(source) if output_format == "jpg" else load_image(source)
+    img = draw_calendar_strips(img, **params)
+    if output_format == "jpg" and img.mode != "RGB":
+        img = img.convert("RGB")
+    output = io.BytesIO()
+    img.save(output, format=_PIL_FORMATS[output_format],
+             **save_options(f"output.{output_format}", preset, img.info))
+    return output.getvalue()
+
+
+class RenderService:
+    def __init__(self, workers=None, max_concurrent=None, queue_timeout=QUEUE_TIMEOUT):
+        self.workers = workers or default_workers()
+        self.queue_timeout = queue_timeout
+        self.max_concurrent = max_concurrent or self.workers * 2
+        self._slots = threading.BoundedSemaphore(self.max_concurrent)
+        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._cache_bytes = 0
+        self.started = time.time()
+        self.stats = {"requests": 0, "rendered": 0, "cache_hits": 0, "rejected": 0, "errors": 0,
+                      "in_flight": 0, "render_seconds": 0.0}
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.stats[name] += amount
+
+    def render(self, data, params, output_format, preset):
+        # Returns (body, cache_hit); None when every slot stayed busy for queue_timeout
+        key = (hashlib.sha256(data).hexdigest(), json.dumps(params, sort_keys=True), output_format, preset)
+        with self._lock:
+            body = self._cache.get(key)
+            if body is not None:
+                self._cache.move_to_end(key)
+                self.stats["cache_hits"] += 1
+                return body, True
+
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            self.count("rejected")
+            return None, False
+        self.count("in_flight")
+        start = time.perf_counter()
+        try:
+            body = self._submit(data, params, output_format, preset)
+        finally:
+            self.count("in_flight", -1)
+            self._slots.release()
+        self.count("rendered")
+        self.count("render_seconds", time.perf_counter() - start)
+        self._store(key, body)
+        return body, False
+
+    def _submit(self, data, params, output_format, preset):
+        executor = self._executor
+        try:
+            return executor.submit(render_calendar, data, params, output_format, preset).result()
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory); start a fresh pool for the next requests
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            raise
+
+    def _store(self, key, body):
+        if len(body) > RESPONSE_CACHE_BYTES:
+            return
+        with self._lock:
+            if key in self._cache:
+                return
+            self._cache[key] = body
+            self._cache_bytes += len(body)
+            while len(self._cache) > RESPONSE_CACHE_SIZE or self._cache_bytes > RESPONSE_CACHE_BYTES:
+                _, evicted = self._cache.popitem(last=False)
+                self._cache_bytes -= len(evicted)
+
+    def health(self):
+        with self._lock:
+            stats = dict(self.stats)
+            cached = len(self._cache)
+        rendered = stats["rendered"]
+        return {
+            "status": "ok",
+            "uptime_s": time.time() - self.started,
+            "workers": self.workers,
+            "max_concurrent": self.max_concurrent,
+            "cached_responses": cached,
+            "mean_render_s": stats["render_seconds"] / rendered if rendered else None,
+            **stats,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+class RenderHandler(BaseHTTPRequestHandler):
+    # POST /calendar?<settings> with the image file as the request body returns the image
+    # with the calendar added; GET /health returns the service's counters as JSON
+    service = None
+
+    def do_GET(self):
+        if urlparse(self.path).path == "/health":
+            self.send_json(200, self.service.health())
+        else:
+            self.send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/calendar":
+            self.send_json(404, {"error": "not found"})
+            return
+        self.service.count("requests")
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            # The body's end is unknown, so the connection cannot be reused
+            self.close_connection = True
+            self.send_json(400, {"error": "invalid Content-Length"})
+            return
+        if length > MAX_UPLOAD_BYTES:
+            self.close_connection = True
+            self.send_json(413, {"error": f"images are limited to {MAX_UPLOAD_BYTES} bytes"})
+            return
+        data = self.rfile.read(length)
+        if not data:
+            self.send_json(400, {"error": "the request body must be an image"})
+            return
+        try:
+            params, output_format, preset = parse_params(url.query)
+        except ValueError as e:
+            self.send_json(400, {"error": str(e)})
+            return
+
+        try:
+            body, cache_hit = self.service.render(data, params, output_format, preset)
+        except Exception as e:
+            self.service.count("errors")
+            self.send_json(422, {"error": f"could not render the image: {e}"})
+            return
+        if body is None:
+            self.send_json(503, {"error": "all render workers are busy, try again later"})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPES[output_format])
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("X-Cache", "hit" if cache_hit else "miss")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def make_server(host="127.0.0.1", port=8080, workers=None, max_concurrent=None):
+    service = RenderService(workers, max_concurrent)
+    handler = type("BoundRenderHandler", (RenderHandler,), {"service": service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server, service
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve calendar wallpapers over HTTP on this machine.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=None, help="render processes (default: CPU count)")
+    parser.add_argument("--max-concurrent", type=int, default=None,
+                        help="renders accepted at once before requests wait (default: 2 per worker)")
+    args = parser.parse_args()
+
+    server, service = make_server(args.host, args.port, args.workers, args.max_concurrent)
+    print(f"Serving on http://{args.host}:{server.server_address[1]} with {service.workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
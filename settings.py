@@ -0,0 +1,25 @@
+import json
+import os
+
+# The calendar settings of the GUI's last batch run, for headless tools such as watch.py.
+# {"params": add_calendar settings, "output_format", "preset", "input_folder", "output_folder"}
+SETTINGS_PATH = os.path.join(os.environ.get("XDG_CONFIG_HOME") or os.path.join(os.path.expanduser("~"), ".config"),
+                             "tapezieren", "settings.json")
+
+
+def load(path=SETTINGS_PATH):
+    # None if nothing was saved yet
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save(data, path=SETTINGS_PATH):
+    # Written to a temporary file and renamed, so readers never see a half-written file
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=1, default=list)
+    os.replace(tmp_path, path)
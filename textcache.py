@@ -0,0 +1,72 @@
+import functools
+
+from PIL import Image, ImageDraw, ImageFont
+
+# Upper bound on loaded ImageFont objects kept around, keyed by (path, size)
+FONT_CACHE_SIZE = 64
+# Upper bound on measured and rasterized labels, keyed by (font, text, stroke width)
+LABEL_CACHE_SIZE = 4096
+
+# ImageDraw's ink when text is drawn with fill=None, e.g. the inside of hollow text
+DEFAULT_INK = (255, 255, 255, 255)
+
+
+@functools.lru_cache(maxsize=FONT_CACHE_SIZE)
+def load_font(font_path, font_size):
+    return ImageFont.truetype(font_path, font_size)
+
+
+@functools.lru_cache(maxsize=LABEL_CACHE_SIZE)
+def get_label(font, text, stroke_width=0):
+    # Returns (bbox, fill_mask, stroke_mask). bbox matches draw.textbbox((0, 0), text, font=font);
+    # the masks are (offset, "L" image) pairs, stroke_mask is None without a stroke.
+    bbox = font.getbbox(text, mode="L")
+    fill_mask = _render_mask(font, text, 0)
+    stroke_mask = _render_mask(font, text, stroke_width) if stroke_width else None
+    return bbox, fill_mask, stroke_mask
+
+
+def _render_mask(font, text, stroke_width):
+    left, top, right, bottom = font.getbbox(text, mode="L", stroke_width=stroke_width)
+    mask = Image.new("L", (max(0, right - left), max(0, bottom - top)), 0)
+    if mask.width and mask.height:
+        ImageDraw.Draw(mask).text((-left, -top), text, font=font, fill=255,
+                                  stroke_width=stroke_width, stroke_fill=255)
+    return (left, top), mask
+
+
+def draw_label(image, xy, label, color, stroke_color=None):
+    # Equivalent to draw.text(xy, text, fill=color) or, with stroke_color, to
+    # draw.text(xy, text, fill=color, stroke_width=..., stroke_fill=stroke_color)
+    x, y = xy
+    _, fill_mask, stroke_mask = label
+    if stroke_color is not None and stroke_mask is not None:
+        _paste_mask(image, x, y, stroke_mask, stroke_color)
+    _paste_mask(image, x, y, fill_mask, color)
+
+
+def label_bounds(xy, label):
+    # (left, top, right, bottom) of the pixels draw_label touches when drawing at xy
+    x, y = xy
+    _, fill_mask, stroke_mask = label
+    bounds = None
+    for (left, top), mask in (fill_mask, stroke_mask or fill_mask):
+        box = (x + left, y + top, x + left + mask.width, y + top + mask.height)
+        if bounds is None:
+            bounds = box
+        else:
+            bounds = (min(bounds[0], box[0]), min(bounds[1], box[1]),
+                      max(bounds[2], box[2]), max(bounds[3], box[3]))
+    return bounds
+
+
+def _paste_mask(image, x, y, offset_mask, color):
+    (left, top), mask = offset_mask
+    if mask.width and mask.height:
+        image.paste(_ink(color), (x + left, y + top), mask)
+
+
+def _ink(color):
+    if len(color) == 3:
+        return (*color, 255)
+    return tuple(color)
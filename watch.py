@@ -0,0 +1,237 @@
+import argparse
+import os
+import time
+from functools import partial
+
+import profiling
+import settings
+from batch import ENCODER_PRESETS, IMAGE_EXTENSIONS, output_path_for
+from manifest import RenderManifest, params_hash
+from pipeline import run_pipeline
+from render import draw_calendar_strips, find_font_path, load_image_for_output, save_image
+
+# Watches a folder and renders images as they are dropped into it, with the settings the
+# GUI saved for its last run. The folder is polled: each poll only lists it and compares
+# mtimes and sizes, so new images are picked up within POLL_INTERVAL plus SETTLE_SECONDS.
+POLL_INTERVAL = 0.1
+# How long a file must go unmodified before it is read, so files still being copied in
+# are not decoded half-written
+SETTLE_SECONDS = 0.3
+
+
+def snapshot(folder):
+    # image path -> (mtime_ns, size) for the images directly in folder
+    images = {}
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.name.startswith(".") or not entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            try:
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+            except OSError:
+                # Removed since the listing
+                continue
+            images[entry.path] = (stat.st_mtime_ns, stat.st_size)
+    return images
+
+
+class FolderWatcher:
+    # Finds the images that are new or changed since they were last handled. An image is
+    # only reported once two polls in a row saw the same mtime and size and it was last
+    # modified at least settle seconds ago; files copied in with their original mtime are
+    # therefore ready on the second poll.
+    def __init__(self, folder, settle=SETTLE_SECONDS):
+        self.folder = folder
+        self.settle = settle
+        self._previous = {}
+        self._handled = {}
+
+    def poll(self):
+        # (image_path, signature) for each settled image that needs handling
+        current = snapshot(self.folder)
+        now = time.time_ns()
+        ready = []
+        for image_path, signature in sorted(current.items()):
+            if self._handled.get(image_path) == signature or self._previous.get(image_path) != signature:
+                continue
+            if now - signature[0] < self.settle * 1e9:
+                continue
+            ready.append((image_path, signature))
+        for image_path in set(self._handled) - set(current):
+            del self._handled[image_path]
+        self._previous = current
+        return ready
+
+    def handled(self, image_path, signature):
+        # If the file changes again it is reported again
+        self._handled[image_path] = signature
+
+    def waiting(self):
+        # Whether an image seen in the last poll has not been handled yet
+        return any(self._handled.get(image_path) != signature for image_path, signature in self._previous.items())
+
+    def reset(self):
+        self._handled.clear()
+
+
+class WatchSettings:
+    # The saved settings, reloaded whenever the settings file changes. overrides (e.g.
+    # {"preset": "fast"}) take precedence over what is saved.
+    def __init__(self, path=settings.SETTINGS_PATH, overrides=None):
+        self.path = path
+        self.overrides = overrides or {}
+        self._signature = None
+        self.data = None
+
+    def changed(self):
+        # True when new settings were loaded. An unreadable file keeps the previous settings,
+        # unless there are none yet.
+        try:
+            stat = os.stat(self.path)
+            signature = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            signature = None
+        if signature == self._signature:
+            return False
+        self._signature = signature
+        try:
+            data = settings.load(self.path)
+        except (OSError, ValueError):
+            data = None
+        if data is None or "params" not in data:
+            if self.data is None:
+                raise ValueError(f"no saved settings in {self.path}; run a batch in the GUI first")
+            print(f"Could not read {self.path}, keeping the previous settings")
+            return False
+        self.data = dict(data, **self.overrides)
+        return True
+
+    @property
+    def params(self):
+        return self.data["params"]
+
+    @property
+    def output_format(self):
+        return self.data.get("output_format")
+
+    @property
+    def preset(self):
+        return self.data.get("preset")
+
+    @property
+    def digest(self):
+        # The same digest the GUI records, so outputs from either one count as current
+        return params_hash(dict(self.params, preset=self.preset) if self.preset else self.params)
+
+
+def render_ready(ready, output_folder, watch_settings, manifest, force=False, progress=None):
+    # Renders the images in ready that are not already up to date; returns the BatchResults
+    jobs = [(image_path, output_path_for(output_folder, image_path, output_format=watch_settings.output_format))
+            for image_path, _ in ready]
+    digest = watch_settings.digest
+    if not force:
+        jobs = manifest.pending(jobs, digest)
+    if not jobs:
+        return []
+    outputs = dict(jobs)
+
+    def record_progress(done, total, result):
+        if result.success:
+            manifest.record(result.image_path, result.output_path, digest)
+        if progress:
+            progress(done, total, result)
+
+    try:
+        return run_pipeline(jobs, partial(draw_calendar_strips, **watch_settings.params),
+                            lambda image_path: load_image_for_output(image_path, outputs[image_path]),
+                            partial(save_image, preset=watch_settings.preset), progress=record_progress)
+    finally:
+        manifest.save()
+
+
+def watch(input_folder, output_folder, watch_settings, interval=POLL_INTERVAL, settle=SETTLE_SECONDS,
+          force=False, once=False, progress=None):
+    # Renders every image that is not up to date, then keeps rendering new and changed ones
+    # until interrupted. With once, returns after the images already in the folder are done.
+    if os.path.abspath(input_folder) == os.path.abspath(output_folder):
+        raise ValueError("the output folder must not be the input folder")
+    os.makedirs(output_folder, exist_ok=True)
+    manifest = RenderManifest(output_folder)
+    watcher = FolderWatcher(input_folder, settle)
+    watch_settings.changed()
+    # Builds the font index now rather than on the first dropped image
+    params = watch_settings.params
+    find_font_path(params["font_name"], params.get("bold", False), params.get("italic", False))
+
+    # The first poll only takes the snapshot that the next one compares against
+    watcher.poll()
+    while True:
+        if watch_settings.changed():
+            print("Settings changed, checking every image again")
+            watcher.reset()
+        ready = watcher.poll()
+        if ready:
+            render_ready(ready, output_folder, watch_settings, manifest, force, progress)
+            for image_path, signature in ready:
+                watcher.handled(image_path, signature)
+        elif once and not watcher.waiting():
+            return
+        time.sleep(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render images as they are added to a folder, with the "
+                                                 "settings of the GUI's last batch run.")
+    parser.add_argument("input_folder", nargs="?", help="folder to watch (default: the GUI's last input folder)")
+    parser.add_argument("output_folder", nargs="?", help="default: the GUI's last output folder")
+    parser.add_argument("--settings", default=settings.SETTINGS_PATH,
+                        help=f"saved settings to render with (default: {settings.SETTINGS_PATH})")
+    parser.add_argument("--format", choices=["png", "jpg", "webp"], help="output format (overrides the settings)")
+    parser.add_argument("--preset", choices=list(ENCODER_PRESETS), help="encoder settings (overrides the settings)")
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL, help="seconds between polls")
+    parser.add_argument("--settle", type=float, default=SETTLE_SECONDS,
+                        help="seconds a file must stay unmodified before it is rendered")
+    parser.add_argument("--force", action="store_true", help="re-render outputs that are already up to date")
+    parser.add_argument("--once", action="store_true", help="render what is in the folder now, then exit")
+    parser.add_argument("--profile", metavar="REPORT_JSON",
+                        help="time each stage and write a summary on exit (p50/p95, images/sec, peak RSS)")
+    args = parser.parse_args()
+
+    overrides = {key: value for key, value in (("output_format", args.format), ("preset", args.preset)) if value}
+    watch_settings = WatchSettings(args.settings, overrides)
+    try:
+        watch_settings.changed()
+    except ValueError as e:
+        print(e)
+        return 1
+    input_folder = args.input_folder or watch_settings.data.get("input_folder")
+    output_folder = args.output_folder or watch_settings.data.get("output_folder")
+    if not input_folder or not output_folder:
+        print("Pass the input and output folders; the saved settings do not name them")
+        return 1
+    if args.profile:
+        profiling.enable()
+
+    def report_progress(done, total, result):
+        status = "ok" if result.success else f"failed: {result.error}"
+        print(f"{time.strftime('%H:%M:%S')} {os.path.basename(result.image_path)} {status}")
+
+    print(f"Watching {input_folder}, writing to {output_folder}")
+    try:
+        watch(input_folder, output_folder, watch_settings, args.interval, args.settle, args.force, args.once,
+              report_progress)
+    except KeyboardInterrupt:
+        pass
+    except ValueError as e:
+        print(e)
+        return 1
+    finally:
+        if args.profile:
+            profiling.write_report(args.profile)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -2,10 +2,11 @@ import tkinter as tk
 from tkinter import ttk, colorchooser, filedialog, messagebox
 from PIL import Image, ImageDraw, ImageFont, ImageTk
 import os
-from datetime import datetime
-import calendar
-import matplotlib.font_manager as fm
-from io import BytesIO
+import dedup
+import fontcatalog
+from batch import IMAGE_EXTENSIONS, list_images, output_path_for, run_batch
+# Rendering lives in render.py; add_calendar is kept importable from here
+from render import add_text_calendar as add_calendar, draw_rounded_rectangle, find_font_path, generate_calendar_text
 
 
 class CalendarStyle:
@@ -22,10 +23,13 @@ class CalendarGUI:
         self.master = master
         master.title("Tapezieren - Enhanced Calendar Overlay")
 
-        self.fonts = get_monospaced_fonts()
+        # Fonts from the catalog saved by the last launch; a rescan runs in the background
+        cached_fonts = fontcatalog.load_cached()
+        self.fonts = get_monospaced_fonts(cached_fonts) if cached_fonts else []
         if not self.fonts:
             print("No monospaced fonts detected. Adding fallback options.")
             self.fonts = ["Consolas", "Monospace"]
+        self.font_scan = fontcatalog.refresh_async()
 
         self.styles = [
             CalendarStyle("Classic", (0, 0, 0), 128, 0, (255, 255, 255)),
@@ -37,6 +41,23 @@ class CalendarGUI:
 
         self.input_folder = ""
         self.output_folder = ""
+        self.master.after(100, self.poll_font_scan)
+
+    def poll_font_scan(self):
+        if not self.font_scan.done():
+            self.master.after(100, self.poll_font_scan)
+            return
+        try:
+            fonts = get_monospaced_fonts(self.font_scan.result())
+        except Exception as e:
+            print(f"Failed to scan fonts: {e}")
+            return
+        if not fonts:
+            return
+        self.fonts = fonts
+        self.font_dropdown.configure(values=self.fonts)
+        if self.font_var.get() not in self.fonts:
+            self.font_dropdown.set(self.fonts[0])
 
     def create_widgets(self):
         # Font selection
@@ -130,7 +151,7 @@ class CalendarGUI:
             messagebox.showwarning("Warning", "Please select an input folder first.")
             return
 
-        image_files = [f for f in os.listdir(self.input_folder) if f.lower().endswith(('.png', '.jpg', '.jpeg'))]
+        image_files = [f for f in os.listdir(self.input_folder) if f.lower().endswith(IMAGE_EXTENSIONS)]
         if not image_files:
             messagebox.showwarning("Warning", "No image files found in the input folder.")
             return
@@ -151,12 +172,12 @@ class CalendarGUI:
             font_size = self.font_size_var.get()
             font = ImageFont.truetype(font_path, font_size)
 
-            cal_text = self.generate_calendar_text()
+            cal_text = generate_calendar_text()
 
             box_color = self.box_color + (self.transparency_var.get(),)
             corner_radius = self.corner_radius_var.get()
 
-            self.draw_rounded_rectangle(draw, (10, 10, img.width - 10, img.height - 10), box_color, corner_radius)
+            draw_rounded_rectangle(draw, (10, 10, img.width - 10, img.height - 10), box_color, corner_radius)
 
             draw.text((20, 20), cal_text, font=font, fill=self.font_color)
 
@@ -172,32 +193,10 @@ class CalendarGUI:
         selected_font = self.font_var.get()
         font_path = selected_font
         if not os.path.isfile(font_path):
-            try:
-                font_path = fm.findfont(fm.FontProperties(family=selected_font))
-            except:
-                font_path = ImageFont.load_default().path
+            # A family name (e.g. one of the fallback options) rather than a font file
+            font_path = find_font_path(selected_font) or ImageFont.load_default().path
         return font_path
 
-    def generate_calendar_text(self):
-        now = datetime.now()
-        year, month = now.year, now.month
-        cal = calendar.monthcalendar(year, month)
-        month_name = calendar.month_name[month]
-        cal_text = f"{month_name} {year}\n"
-        cal_text += "Su Mo Tu We Th Fr Sa\n"
-        for week in cal:
-            cal_text += " ".join(f"{day:2}" if day != 0 else "  " for day in week) + "\n"
-        return cal_text
-
-    def draw_rounded_rectangle(self, draw, xy, fill, radius):
-        x1, y1, x2, y2 = xy
-        draw.rectangle([x1 + radius, y1, x2 - radius, y2], fill=fill)
-        draw.rectangle([x1, y1 + radius, x2, y2 - radius], fill=fill)
-        draw.pieslice([x1, y1, x1 + radius * 2, y1 + radius * 2], 180, 270, fill=fill)
-        draw.pieslice([x2 - radius * 2, y1, x2, y1 + radius * 2], 270, 360, fill=fill)
-        draw.pieslice([x1, y2 - radius * 2, x1 + radius * 2, y2], 90, 180, fill=fill)
-        draw.pieslice([x2 - radius * 2, y2 - radius * 2, x2, y2], 0, 90, fill=fill)
-
     def process_images(self):
         if not self.input_folder or not self.output_folder:
             tk.messagebox.showerror("Error", "Please select both input and output folders.")
@@ -210,106 +209,46 @@ class CalendarGUI:
         box_color = self.box_color + (self.transparency_var.get(),)
         corner_radius = self.corner_radius_var.get()
 
-        process_folder(self.input_folder, self.output_folder, font_path, font_size, self.font_color, box_color,
-                       corner_radius)
-        tk.messagebox.showinfo("Success", "Images processed successfully!")
+        dedup_stats = {}
+        results = process_folder(self.input_folder, self.output_folder, font_path, font_size, self.font_color,
+                                 box_color, corner_radius, dedupe=True, dedup_stats=dedup_stats)
+        failed = [os.path.basename(result.image_path) for result in results if not result.success]
+        if failed:
+            tk.messagebox.showerror("Error", f"Failed to process {len(failed)} images:\n" + "\n".join(failed[:20]))
+            return
+        tk.messagebox.showinfo("Success", "Images processed successfully" + dedup.describe(dedup_stats) + "!")
 
 
-def process_folder(folder_path, output_folder, font_path, font_size, font_color, box_color, corner_radius):
+def process_folder(folder_path, output_folder, font_path, font_size, font_color, box_color, corner_radius,
+                   workers=None, progress=None, dedupe=False, dedup_stats=None):
+    # dedupe renders byte-identical inputs once and links the other outputs to it; pass a
+    # dict as dedup_stats to receive dedup.report's numbers
     if not os.path.exists(folder_path):
         print(f"The folder {folder_path} does not exist.")
-        return
+        return []
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
 
-    for filename in os.listdir(folder_path):
-        if filename.lower().endswith((".jpg", ".jpeg", ".png")):
-            image_path = os.path.join(folder_path, filename)
-            output_path = os.path.join(output_folder, f"calendar_{filename}")
-            add_calendar(image_path, output_path, font_path, font_size, font_color, box_color, corner_radius)
-
-
-def add_calendar(image_path, output_path, font_path, font_size, font_color, box_color, corner_radius):
-    try:
-        with Image.open(image_path).convert("RGBA") as img:
-            draw = ImageDraw.Draw(img)
-
-            base_resolution = 1000
-            relative_font_size = int(font_size * (max(img.size) / base_resolution))
-
-            try:
-                font = ImageFont.truetype(font_path, relative_font_size)
-            except IOError:
-                print(f"Failed to load font {font_path}. Using default font.")
-                font = ImageFont.load_default()
-
-            cal_text = generate_calendar_text()
-
-            calendar_lines = cal_text.split('\n')
-            line_height = draw.textbbox((0, 0), "A", font=font)[3]
-            total_height = line_height * len(calendar_lines)
-            max_line_width = max(draw.textbbox((0, 0), line, font=font)[2] for line in calendar_lines)
-
-            margin = int(0.05 * min(img.size))
-            text_x = img.size[0] - max_line_width - margin
-            text_y = (img.size[1] - total_height) // 2
-
-            box_padding = int(0.02 * min(img.size))
-            box_x1 = text_x - box_padding
-            box_y1 = text_y - box_padding
-            box_x2 = img.size[0] - margin + box_padding
-            box_y2 = text_y + total_height + box_padding
-
-            draw_rounded_rectangle(draw, (box_x1, box_y1, box_x2, box_y2), box_color, corner_radius)
-
-            current_y = text_y
-            for line in calendar_lines:
-                draw.text((text_x, current_y), line, font=font, fill=font_color)
-                current_y += line_height
-
-            if output_path.lower().endswith((".jpg", ".jpeg")):
-                img = img.convert("RGB")
-
-            img.save(output_path)
-            print(f"Saved output to {output_path}")
-    except Exception as e:
-        print(f"Failed to process {image_path}: {e}")
-
-
-def generate_calendar_text():
-    now = datetime.now()
-    year, month = now.year, now.month
-    cal = calendar.monthcalendar(year, month)
-    month_name = calendar.month_name[month]
-    cal_text = f"{month_name} {year}\n"
-    cal_text += "Su Mo Tu We Th Fr Sa\n"
-    for week in cal:
-        cal_text += " ".join(f"{day:2}" if day != 0 else "  " for day in week) + "\n"
-    return cal_text
-
-def draw_rounded_rectangle(draw, xy, fill, radius):
-    x1, y1, x2, y2 = xy
-    draw.rectangle([x1+radius, y1, x2-radius, y2], fill=fill)
-    draw.rectangle([x1, y1+radius, x2, y2-radius], fill=fill)
-    draw.pieslice([x1, y1, x1+radius*2, y1+radius*2], 180, 270, fill=fill)
-    draw.pieslice([x2-radius*2, y1, x2, y1+radius*2], 270, 360, fill=fill)
-    draw.pieslice([x1, y2-radius*2, x1+radius*2, y2], 90, 180, fill=fill)
-    draw.pieslice([x2-radius*2, y2-radius*2, x2, y2], 0, 90, fill=fill)
-
-def get_monospaced_fonts():
-    monospaced_fonts = []
-    all_fonts = fm.findSystemFonts()
-    print(f"Total fonts found: {len(all_fonts)}")
-    for font in all_fonts:
-        try:
-            with ImageFont.truetype(font, 12) as pil_font:
-                widths = [pil_font.getbbox(char)[2] for char in 'il1']
-                if len(set(widths)) == 1:
-                    monospaced_fonts.append(font)
-        except Exception as e:
-            print(f"Error processing font {font}: {e}")
+    jobs = [(image_path, output_path_for(output_folder, image_path)) for image_path in list_images(folder_path)]
+    copies = []
+    if dedupe:
+        jobs, copies = dedup.plan(jobs)
+    results = run_batch(add_calendar, jobs, args=(font_path, font_size, font_color, box_color, corner_radius),
+                        workers=workers, progress=progress)
+    created = dedup.materialize(copies, {result.output_path for result in results if result.success})
+    if dedup_stats is not None:
+        dedup_stats.update(dedup.report(copies, created))
+    return results
+
+
+def get_monospaced_fonts(catalog=None):
+    # Monospace detection ('i', 'l' and '1' equally wide) is stored in the font catalog
+    if catalog is None:
+        catalog = fontcatalog.get_catalog()
+    monospaced_fonts = [font_path for font_path, entry in fontcatalog.fonts(catalog) if entry["monospace"]]
+    print(f"Total fonts found: {len(catalog)}")
     print(f"Monospaced fonts found: {len(monospaced_fonts)}")
-    return sorted(set(monospaced_fonts))
+    return monospaced_fonts
 
 if __name__ == "__main__":
     root = tk.Tk()